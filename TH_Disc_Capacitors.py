@@ -1,16 +1,20 @@
-import requests
-import re
+from .search_cache import cached_search
+from .digikey_client import keyword_search, PAGE_SIZE
+from .product_extract import extract, parse_dim, CAP_VALUE_RE, DESC_VOLTAGE_RE, LXW_MM_RE, PITCH_MM_RE
+from .product_records import compact_response
+from .catalog_store import get_catalog_store, query_capacitors
+from .perf_log import timed
 
 TH_DISC_CAP_PAD_SIZE = 1.6
 
-def search_tht_disc_capacitor(capacitance, voltage, cat_id, access_token, client_id, token_refresher=None):
+def search_tht_disc_capacitor(capacitance, voltage, cat_id, access_token, client_id, token_refresher=None, bypass_cache=False, offset=0, offline=False, compact=False):
     # Format Capacitance
     cap_clean = capacitance.strip()
     if not cap_clean.endswith("F"):
         cap_clean += "F"
     
     # Ensure space between value and unit (e.g. "22 µF")
-    match = re.match(r'^([\d\.]+)\s*([µumkM]?)F$', cap_clean)
+    match = CAP_VALUE_RE.match(cap_clean)
     if match:
         val, unit = match.groups()
         cap_str = f"{val} {unit}F"
@@ -24,6 +28,11 @@ def search_tht_disc_capacitor(capacitance, voltage, cat_id, access_token, client
         vol_clean = voltage.lower().replace("v", "").strip()
         vol_str = f"{vol_clean} V"
 
+    # Answer from the local catalog mirror instead of DigiKey
+    if offline:
+        result = query_capacitors(get_catalog_store(), cat_id, cap_str, vol_str, offset=offset)
+        return compact_response(result) if compact else result
+
     filters = [
         {"ParameterID": 2049, "FilterValues": [{"Id": cap_str}]},
         {"ParameterId": 69, "FilterValues": [{"Id": "411897"}]},
@@ -32,11 +41,10 @@ def search_tht_disc_capacitor(capacitance, voltage, cat_id, access_token, client
     if vol_str:
         filters.append({"ParameterId": 2079, "FilterValues": [{"Id": vol_str}]})
 
-    url = "https://api.digikey.com/products/v4/search/keyword"
     payload = {
         "Keywords": "capacitor",
-        "Limit": 50,
-        "Offset": 0,
+        "Limit": PAGE_SIZE,
+        "Offset": offset,
         "MinimumQuantityAvailable": 1,
         "FilterOptionsRequest": {
             "MinimumOrderQuantity": 1,
@@ -51,21 +59,13 @@ def search_tht_disc_capacitor(capacitance, voltage, cat_id, access_token, client
         "ExcludedContent": ["FilterOptions"],
         "SortOptions": {"Field": "Price", "SortOrder": "Ascending"}
     }
-    headers = {
-        "x-digikey-client-id": client_id,
-        "content-type": "application/json",
-        "authorization": f"Bearer {access_token}"
-    }
-    response = requests.post(url, json=payload, headers=headers)
-    
-    if response.status_code == 401 and token_refresher:
-        new_token = token_refresher()
-        if new_token:
-            headers["authorization"] = f"Bearer {new_token}"
-            response = requests.post(url, json=payload, headers=headers)
 
-    return response.json()
+    def fetch():
+        return keyword_search(payload, access_token, client_id, token_refresher)
 
+    return cached_search(payload, fetch, bypass_cache=bypass_cache, compact=compact)
+
+@timed("process_disc_capacitor")
 def process_disc_capacitor(product_json, lib_config=None):
     if lib_config is None:
         lib_config = {}
@@ -74,46 +74,25 @@ def process_disc_capacitor(product_json, lib_config=None):
     sym_lib_name = lib_config.get("sym_lib", "C_TH_emDashGameChanger")
     fp_lib_name = lib_config.get("fp_lib", "C_TH_emDashGameChanger")
 
-    # 1. General Info
-    mpn = product_json.get("ManufacturerProductNumber", "Unknown")
-    datasheet = product_json.get("DatasheetUrl", "")
-    price = product_json.get("UnitPrice", 0.0)
-    
-    # DK Part Number
-    variations = product_json.get("ProductVariations", [])
-    dk_pn = "N/A"
-    for v in variations:
-        if v.get("PackageType", {}).get("Id") in [1, 2]: # Tape&Reel or CutTape
-            dk_pn = v.get("DigiKeyProductNumber")
-            break
-    if dk_pn == "N/A" and variations:
-        dk_pn = variations[0].get("DigiKeyProductNumber")
-
-    # 2. Parameters
-    params = product_json.get("Parameters", [])
-    capacitance = "Unknown"
-    tolerance = "Unknown"
-    voltage = "Unknown"
-    lead_spacing_raw = "Unknown"
-    diameter_raw = "Unknown"
-    
-    for p in params:
-        pid = p.get("ParameterId")
-        val = p.get("ValueText", "Unknown")
-        if pid == 2049: capacitance = val
-        elif pid == 3: tolerance = val
-        elif pid == 2079: voltage = val
-        elif pid == 508: lead_spacing_raw = val
-        elif pid == 46: diameter_raw = val
+    # 1. General Info and Parameters
+    record = extract(product_json, "disc")
+    mpn = record.mpn
+    datasheet = record.datasheet
+    price = record.price
+    dk_pn = record.dk_pn
+    capacitance = record.capacitance
+    tolerance = record.tolerance
+    voltage = record.voltage
+    lead_spacing_raw = record.lead_spacing
+    diameter_raw = record.diameter_raw
 
     # Fallback for Voltage if Unknown
     if voltage == "Unknown":
-        desc = product_json.get("Description", {}).get("DetailedDescription", "")
-        match = re.search(r'(\d+(\.\d+)?)\s*V', desc)
+        match = DESC_VOLTAGE_RE.search(record.description)
         if match:
             voltage = match.group(1) + "V"
 
-    # 3. Parsing
+    # 2. Parsing
     diameter = 0.0
     width = 3.0 # Default thickness for disc capacitors if not specified
     diameter_str = "0.0"
@@ -121,7 +100,7 @@ def process_disc_capacitor(product_json, lib_config=None):
 
     if diameter_raw and diameter_raw != "Unknown":
         # Try LxW format first: "0.157\" L x 0.098\" W (4.00mm x 2.50mm)"
-        lxw_match = re.search(r'\(([\d\.]+)\s*mm\s*x\s*([\d\.]+)\s*mm\)', diameter_raw)
+        lxw_match = LXW_MM_RE.search(diameter_raw)
         if lxw_match:
             diameter = float(lxw_match.group(1))
             width = float(lxw_match.group(2))
@@ -129,18 +108,12 @@ def process_disc_capacitor(product_json, lib_config=None):
             width_str = lxw_match.group(2)
         else:
             # Try Diameter format: "0.252\" Dia (6.40mm)"
-            dia_match = re.search(r'\(?([\d\.]+)\s*mm\)?', diameter_raw)
+            dia_match = PITCH_MM_RE.search(diameter_raw)
             if dia_match:
                 diameter = float(dia_match.group(1))
                 diameter_str = dia_match.group(1)
 
-    def parse_pitch(val):
-        if not val or val == "Unknown": return 0.0, "0.0"
-        match = re.search(r'\(?([\d\.]+)\s*mm\)?', val)
-        if match: return float(match.group(1)), match.group(1)
-        return 0.0, "0.0"
-
-    pin_pitch, pin_pitch_str = parse_pitch(lead_spacing_raw)
+    pin_pitch, pin_pitch_str = parse_dim(lead_spacing_raw, PITCH_MM_RE)
 
     # Formatting
     if capacitance != "Unknown": capacitance = capacitance.replace("uF", "µF").replace(" ", "")
@@ -181,31 +154,3 @@ def process_disc_capacitor(product_json, lib_config=None):
         "sym_template": "symbolTemplates/TH_CapacitorDiscSymbolTemplate.txt",
         "sym_preamble": '(kicad_symbol_lib\n\t(version 20231120)\n\t(generator "emDashGameChanger\'s capacitor-disc generator")\n\t(generator_version "0.1")\n'
     }
-
-if __name__ == '__main__':
-    # Example usage (replace with actual values from gui.py)
-    capacitance = "100 pF"
-    voltage = "50 V"
-    cat_id = "60"  # Example category ID for ceramic disc capacitors
-    access_token = "YOUR_ACCESS_TOKEN"
-    client_id = "YOUR_CLIENT_ID"
-
-    results = search_tht_disc_capacitor(capacitance, voltage, cat_id, access_token, client_id)
-
-    if results and results.get("ProductsCount", 0) > 0:
-        print("Search Results:")
-        for product in results["Products"]:
-            mpn = product.get("ManufacturerProductNumber", "N/A")
-            price = str(product.get("UnitPrice", "N/A"))
-            stock = str(product.get("QuantityAvailable", "N/A"))
-            desc = product.get("Description", {}).get("DetailedDescription", "N/A")
-
-            print(f"  MPN: {mpn}")
-            print(f"  Price: {price}")
-            print(f"  Stock: {stock}")
-            print(f"  Description: {desc}")
-            print("-" * 20)
-    elif results is None:
-        print("API call failed.")
-    else:
-        print("No results found for the specified criteria.")
@@ -1,8 +1,29 @@
-import requests
-import re
 import math
-
-def generate_capacitor_polygons(diameter=5.0, pitch=2.0):
+import functools
+from .search_cache import cached_search
+from .digikey_client import keyword_search, PAGE_SIZE
+from .product_extract import extract, parse_dim, CAP_VALUE_RE
+from .product_records import compact_response
+from .catalog_store import get_catalog_store, query_capacitors
+from .perf_log import timed
+
+# Max distance between the true arc and a polygon edge, in mm
+SILK_CHORD_ERROR = 0.005
+# Segment count bounds for one arc
+MIN_ARC_STEPS = 2
+MAX_ARC_STEPS = 64
+
+def arc_steps(r, angle, max_chord_error=SILK_CHORD_ERROR):
+    """
+    Segments needed so no chord is further than max_chord_error from an arc of radius r spanning angle radians.
+    """
+    if r <= max_chord_error:
+        return MIN_ARC_STEPS
+    seg_angle = 2 * math.acos(1 - max_chord_error / r)
+    return max(MIN_ARC_STEPS, min(MAX_ARC_STEPS, math.ceil(angle / seg_angle)))
+
+@functools.lru_cache(maxsize=256)
+def _capacitor_polygons(diameter, pitch, max_chord_error):
     # Radius + line thickness adjustment
     r = (diameter / 2) + 0.12
     
@@ -18,46 +39,57 @@ def generate_capacitor_polygons(diameter=5.0, pitch=2.0):
     ko_x_min = (ko_center_x - (ko_size / 2)) - h
     ko_x_max = (ko_center_x + (ko_size / 2)) + h
     ko_y_limit = (ko_size / 2) + h
-    
-    n_steps = 15
-
-    def get_arc_points(y_start, y_end, steps):
-        points = []
-        step_size = (y_end - y_start) / steps
-        for i in range(steps + 1):
-            y = y_start + (i * step_size)
-            x_sq = r*r - y*y
-            # Safety check for sqrt
-            val = max(0, x_sq)
-            x = math.sqrt(val)
-            points.append((x, y))
-        return points
+
+    def get_arc_points(y_start, y_end):
+        # Step by angle rather than by y so the points spread evenly round the arc
+        a_start = math.asin(max(-1.0, min(1.0, y_start / r)))
+        a_end = math.asin(max(-1.0, min(1.0, y_end / r)))
+        steps = arc_steps(r, abs(a_end - a_start), max_chord_error)
+        step_size = (a_end - a_start) / steps
+        angles = [a_start + i * step_size for i in range(steps + 1)]
+        return tuple((r * math.cos(a), r * math.sin(a)) for a in angles)
 
     # 1. RED POLYGON (Middle outer block)
-    red_arc = get_arc_points(-ko_y_limit, ko_y_limit, n_steps)
-    red_poly = red_arc + [(ko_x_max, ko_y_limit), (ko_x_max, -ko_y_limit)]
+    red_arc = get_arc_points(-ko_y_limit, ko_y_limit)
+    red_poly = red_arc + ((ko_x_max, ko_y_limit), (ko_x_max, -ko_y_limit))
 
     # 2. GREEN POLYGONS (Top and Bottom segments)
-    top_green_arc = get_arc_points(-r, -ko_y_limit, n_steps)
-    top_green_poly = top_green_arc + [(0, -ko_y_limit), (0, -r)]
+    top_green_arc = get_arc_points(-r, -ko_y_limit)
+    top_green_poly = top_green_arc + ((0, -ko_y_limit), (0, -r))
     
-    bot_green_arc = get_arc_points(ko_y_limit, r, n_steps)
-    bot_green_poly = bot_green_arc + [(0, r), (0, ko_y_limit)]
+    bot_green_arc = get_arc_points(ko_y_limit, r)
+    bot_green_poly = bot_green_arc + ((0, r), (0, ko_y_limit))
 
     # 3. BLUE RECTANGLE (Left of the keep-out)
-    blue_poly = [
+    blue_poly = (
         (0, -ko_y_limit),
         (ko_x_min, -ko_y_limit),
         (ko_x_min, ko_y_limit),
         (0, ko_y_limit)
-    ]
+    )
 
-    return {"red": red_poly, "green_top": top_green_poly, "green_bottom": bot_green_poly, "blue": blue_poly}
+    return (("red", red_poly), ("green_top", top_green_poly), ("green_bottom", bot_green_poly), ("blue", blue_poly))
+
+def generate_capacitor_polygons(diameter=5.0, pitch=2.0, max_chord_error=SILK_CHORD_ERROR):
+    """
+    Silkscreen polygons for a radial can. Only a few dozen (diameter, pitch) pairs exist,
+    so the geometry is computed once per pair and resolution and reused.
+    """
+    return dict(_capacitor_polygons(float(diameter), float(pitch), max_chord_error))
 
 def format_kicad_poly(points, layer="F.SilkS"):
     xy_str = " ".join([f"(xy {p[0]:.4f} {p[1]:.4f})" for p in points])
     return f"(fp_poly (pts {xy_str}) (stroke (width 0.1) (type solid)) (fill solid) (layer \"{layer}\"))"
 
+@functools.lru_cache(maxsize=256)
+def capacitor_silkscreen(diameter, pitch, max_chord_error=SILK_CHORD_ERROR, layer="F.SilkS"):
+    """
+    The formatted fp_poly strings for generate_capacitor_polygons, keyed the same way.
+    """
+    polys = generate_capacitor_polygons(diameter, pitch, max_chord_error)
+    return {name: format_kicad_poly(points, layer) for name, points in polys.items()}
+
+@timed("process_capacitor")
 def process_capacitor(product_json, lib_config=None):
     if lib_config is None:
         lib_config = {}
@@ -66,54 +98,19 @@ def process_capacitor(product_json, lib_config=None):
     fp_lib_name = lib_config.get("fp_lib", "CP_TH_emDashGameChanger")
 
     # Extraction
-    mpn = product_json.get("ManufacturerProductNumber", "Unknown")
-    datasheet = product_json.get("DatasheetUrl", "")
-    price = product_json.get("UnitPrice", 999.99)
-    
-    # DigiKey PN Logic
-    variations = product_json.get("ProductVariations", [])
-    dk_pn = "N/A"
-    for v in variations:
-        if v.get("PackageType", {}).get("Id") == 2:
-            dk_pn = v.get("DigiKeyProductNumber")
-            break
-    if dk_pn == "N/A":
-        for v in variations:
-            if v.get("PackageType", {}).get("Id") == 1:
-                dk_pn = v.get("DigiKeyProductNumber")
-                break
-    if dk_pn == "N/A" and variations:
-        dk_pn = variations[0].get("DigiKeyProductNumber")
-
-    # Parameters
-    params = product_json.get("Parameters", [])
-    capacitance = "Unknown"
-    tolerance = "Unknown"
-    voltage = "Unknown"
-    lead_spacing = "Unknown"
-    diameter_raw = "Unknown"
-    height_raw = "Unknown"
-    
-    for p in params:
-        pid = p.get("ParameterId")
-        if pid == 2049: capacitance = p.get("ValueText", "Unknown")
-        elif pid == 3: tolerance = p.get("ValueText", "Unknown")
-        elif pid == 2079: voltage = p.get("ValueText", "Unknown")
-        elif pid == 508: lead_spacing = p.get("ValueText", "Unknown")
-        elif pid == 46: diameter_raw = p.get("ValueText", "Unknown")
-        elif pid == 1500: height_raw = p.get("ValueText", "Unknown")
+    record = extract(product_json, "alum")
+    mpn = record.mpn
+    datasheet = record.datasheet
+    price = record.price
+    dk_pn = record.dk_pn
+    capacitance = record.capacitance
+    tolerance = record.tolerance
+    voltage = record.voltage
 
     # Parsing Dimensions
-    def parse_dim(val):
-        if not val or val == "Unknown": return 0.0, "0.0"
-        match = re.search(r'\(?(\d+\.?\d*)\s*mm\)?', val)
-        if match:
-            return float(match.group(1)), match.group(1)
-        return 0.0, "0.0"
-
-    diameter, diameter_str = parse_dim(diameter_raw)
-    lead_spacing_mm, lead_spacing_str = parse_dim(lead_spacing)
-    height, height_str = parse_dim(height_raw)
+    diameter, diameter_str = parse_dim(record.diameter_raw)
+    lead_spacing_mm, lead_spacing_str = parse_dim(record.lead_spacing)
+    height, height_str = parse_dim(record.height_raw)
 
     # Formatting
     if capacitance != "Unknown":
@@ -129,7 +126,7 @@ def process_capacitor(product_json, lib_config=None):
     footprint_name = f"CP_D{diameter_str}mm_P{lead_spacing_str}mm_H{height_str}mm.kicad_mod"
 
     # Polygons
-    polys = generate_capacitor_polygons(diameter, lead_spacing_mm)
+    polys = capacitor_silkscreen(diameter, lead_spacing_mm)
 
     processed_data = {
         "Symbol Data": {
@@ -147,10 +144,10 @@ def process_capacitor(product_json, lib_config=None):
             "diameter": diameter,
             "pinPitch": lead_spacing_mm,
             "height": height,
-            "poly_red": format_kicad_poly(polys['red']),
-            "poly_green_top": format_kicad_poly(polys['green_top']),
-            "poly_green_bottom": format_kicad_poly(polys['green_bottom']),
-            "poly_blue": format_kicad_poly(polys['blue']),
+            "poly_red": polys['red'],
+            "poly_green_top": polys['green_top'],
+            "poly_green_bottom": polys['green_bottom'],
+            "poly_blue": polys['blue'],
             # Silk Screen Plus Sign Center (x = -radius, y = -radius/2)
             "plus_center_x": -(diameter / 2),
             "plus_center_y": -(diameter / 3)
@@ -165,14 +162,14 @@ def process_capacitor(product_json, lib_config=None):
     
     return processed_data
 
-def search_tht_capacitor(capacitance, voltage, type_idx, cat_id, access_token, client_id, token_refresher=None):
+def search_tht_capacitor(capacitance, voltage, type_idx, cat_id, access_token, client_id, token_refresher=None, bypass_cache=False, offset=0, offline=False, compact=False):
     # Format Capacitance
     cap_clean = capacitance.strip()
     if not cap_clean.endswith("F"):
         cap_clean += "F"
     
     # Ensure space between value and unit (e.g. "22 µF")
-    match = re.match(r'^([\d\.]+)\s*([µumkM]?)F$', cap_clean)
+    match = CAP_VALUE_RE.match(cap_clean)
     if match:
         val, unit = match.groups()
         cap_str = f"{val} {unit}F"
@@ -186,6 +183,11 @@ def search_tht_capacitor(capacitance, voltage, type_idx, cat_id, access_token, c
         vol_clean = voltage.lower().replace("v", "").strip()
         vol_str = f"{vol_clean} V"
 
+    # Answer from the local catalog mirror instead of DigiKey
+    if offline:
+        result = query_capacitors(get_catalog_store(), cat_id, cap_str, vol_str, type_idx, offset)
+        return compact_response(result) if compact else result
+
     # Type Mapping (0=Axial, 1=Radial)
     type_id = "317190" if type_idx == 0 else "392320"
     
@@ -196,11 +198,10 @@ def search_tht_capacitor(capacitance, voltage, type_idx, cat_id, access_token, c
     if vol_str:
         filters.append({"ParameterId": 2079, "FilterValues": [{"Id": vol_str}]})
 
-    url = "https://api.digikey.com/products/v4/search/keyword"
     payload = {
         "Keywords": "capacitor",
-        "Limit": 50,
-        "Offset": 0,
+        "Limit": PAGE_SIZE,
+        "Offset": offset,
         "MinimumQuantityAvailable": 1,
         "FilterOptionsRequest": {
             "MinimumOrderQuantity": 1,
@@ -215,17 +216,8 @@ def search_tht_capacitor(capacitance, voltage, type_idx, cat_id, access_token, c
         "ExcludedContent": ["FilterOptions"],
         "SortOptions": {"Field": "Price", "SortOrder": "Ascending"}
     }
-    headers = {
-        "x-digikey-client-id": client_id,
-        "content-type": "application/json",
-        "authorization": f"Bearer {access_token}"
-    }
-    response = requests.post(url, json=payload, headers=headers)
-    
-    if response.status_code == 401 and token_refresher:
-        new_token = token_refresher()
-        if new_token:
-            headers["authorization"] = f"Bearer {new_token}"
-            response = requests.post(url, json=payload, headers=headers)
 
-    return response.json()
\ No newline at end of file
+    def fetch():
+        return keyword_search(payload, access_token, client_id, token_refresher)
+
+    return cached_search(payload, fetch, bypass_cache=bypass_cache, compact=compact)
\ No newline at end of file
@@ -1,44 +1,25 @@
-import requests
-import re
 import math
+from .search_cache import cached_search
+from .digikey_client import keyword_search, PAGE_SIZE
+from .product_extract import extract, RESISTOR_DIMS_RE
+from .product_records import compact_response
+from .catalog_store import get_catalog_store, query_resistors
+from .perf_log import timed
 
 TH_RESISTOR_PAD_SIZE = 1.4
 
+@timed("process_resistor")
 def process_resistor(product_json):
     # Extraction
-    mpn = product_json.get("ManufacturerProductNumber", "Unknown")
-    datasheet = product_json.get("DatasheetUrl", "")
-    price = product_json.get("UnitPrice", 999.99)
-    
-    # DigiKey PN Logic
-    variations = product_json.get("ProductVariations", [])
-    dk_pn = "N/A"
-    # Priority: Cut Tape (2), Tape & Reel (1), then first available
-    for v in variations:
-        if v.get("PackageType", {}).get("Id") == 2:
-            dk_pn = v.get("DigiKeyProductNumber")
-            break
-    if dk_pn == "N/A":
-        for v in variations:
-            if v.get("PackageType", {}).get("Id") == 1:
-                dk_pn = v.get("DigiKeyProductNumber")
-                break
-    if dk_pn == "N/A" and variations:
-        dk_pn = variations[0].get("DigiKeyProductNumber")
-
-    # Parameters
-    params = product_json.get("Parameters", [])
-    resistance = "Unknown"
-    tolerance = "Unknown"
-    power = "Unknown"
-    dims_raw = "Unknown"
-    
-    for p in params:
-        pid = p.get("ParameterId")
-        if pid == 2085: resistance = p.get("ValueId", "Unknown")
-        elif pid == 3: tolerance = p.get("ValueText", "Unknown")
-        elif pid == 2: power = p.get("ValueText", "Unknown")
-        elif pid == 46: dims_raw = p.get("ValueText", "Unknown")
+    record = extract(product_json, "resistor")
+    mpn = record.mpn
+    datasheet = record.datasheet
+    price = record.price
+    dk_pn = record.dk_pn
+    resistance = record.resistance
+    tolerance = record.tolerance
+    power = record.power
+    dims_raw = record.dims_raw
 
     # Processing
     om = "\u03A9"
@@ -52,7 +33,7 @@ def process_resistor(product_json):
     pin_pitch = 0.0
     
     # Dimensions Regex
-    match = re.search(r'([0-9]+\.[0-9]+)mm\sx\s([0-9]+\.[0-9]+)mm', dims_raw)
+    match = RESISTOR_DIMS_RE.search(dims_raw)
     if match:
         diameter = round(float(match.group(1)), 3)
         length = round(float(match.group(2)), 3)
@@ -100,7 +81,7 @@ def process_resistor(product_json):
     
     return processed_data
 
-def search_tht_resistor(resistance, power_idx, tolerance_idx, access_token, client_id, token_refresher=None):
+def search_tht_resistor(resistance, power_idx, tolerance_idx, access_token, client_id, token_refresher=None, bypass_cache=False, offset=0, offline=False, compact=False):
     # Format Resistance Value
     res_val = resistance.strip()
     if res_val.lower().endswith('k'):
@@ -128,11 +109,15 @@ def search_tht_resistor(resistance, power_idx, tolerance_idx, access_token, clie
     }
     tol_val = tol_map.get(tolerance_idx, "2503")
 
-    url = "https://api.digikey.com/products/v4/search/keyword"
+    # Answer from the local catalog mirror instead of DigiKey
+    if offline:
+        result = query_resistors(get_catalog_store(), res_str, power_idx if power_idx in power_map else 0, tolerance_idx, offset)
+        return compact_response(result) if compact else result
+
     payload = {
         "Keywords": "resistor",
-        "Limit": 50,
-        "Offset": 0,
+        "Limit": PAGE_SIZE,
+        "Offset": offset,
         "MinimumQuantityAvailable": 1,
         "FilterOptionsRequest": {
             "MinimumOrderQuantity": 1,
@@ -151,17 +136,8 @@ def search_tht_resistor(resistance, power_idx, tolerance_idx, access_token, clie
         "ExcludedContent": ["FilterOptions"],
         "SortOptions": {"Field": "Price", "SortOrder": "Ascending"}
     }
-    headers = {
-        "x-digikey-client-id": client_id,
-        "content-type": "application/json",
-        "authorization": f"Bearer {access_token}"
-    }
-    response = requests.post(url, json=payload, headers=headers)
-    
-    if response.status_code == 401 and token_refresher:
-        new_token = token_refresher()
-        if new_token:
-            headers["authorization"] = f"Bearer {new_token}"
-            response = requests.post(url, json=payload, headers=headers)
 
-    return response.json()
\ No newline at end of file
+    def fetch():
+        return keyword_search(payload, access_token, client_id, token_refresher)
+
+    return cached_search(payload, fetch, bypass_cache=bypass_cache, compact=compact)
\ No newline at end of file
@@ -1,7 +1,22 @@
 # __init__.py  (inside KicadCompMaker/ folder)
+import time
 
-from .plugin import DigikeyPlugin
-
-# Create an instance and register it with pcbnew
-# This is what makes the plugin appear in Tools → External Plugins
-DigikeyPlugin().register()
+_start = time.perf_counter()
+try:
+    from .plugin import DigikeyPlugin, LOAD_TIMES
+    from . import perf_log
+except ImportError as e:
+    # Not running inside KiCad (e.g. the headless batch import), nothing to register.
+    # Anything else that fails to import is a bug in the plugin and must not be hidden.
+    if e.name != "pcbnew":
+        raise
+    DigikeyPlugin = None
+else:
+    # Create an instance and register it with pcbnew
+    # This is what makes the plugin appear in Tools → External Plugins
+    _plugin = DigikeyPlugin()
+    _plugin.register()
+    _plugin.schedule_warm_up()
+    LOAD_TIMES['register'] = time.perf_counter() - _start
+    if perf_log.ENABLED:
+        print(f"KicadCompMaker: registered in {LOAD_TIMES['register'] * 1000:.1f} ms")
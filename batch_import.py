@@ -0,0 +1,211 @@
+"""
+Headless batch import.
+
+Reads a CSV or JSON list of parts and runs search -> process -> generate for each row
+on a thread pool, picking the cheapest in-stock hit. Run with KiCad's python from the
+folder that contains the plugin:
+
+    python -m KicadCompMaker.batch_import parts.csv --report report.csv
+
+CSV columns (JSON uses the same keys): type, value, rating, tolerance, package
+    type      resistor, alum, disc or mica
+    value     10k, 4.7M, 22u, 100p ...
+    rating    power for resistors (1/8, 1/4, 1/2, 1), voltage for capacitors (50v)
+    tolerance resistors only (0.1%, 1%, 2%, 5%)
+    package   alum and mica only, axial or radial (default radial)
+"""
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from .TH_Resistors import process_resistor, search_tht_resistor
+from .TH_Radial_ElectrolyticCapacitors import process_capacitor, search_tht_capacitor
+from .TH_Disc_Capacitors import search_tht_disc_capacitor, process_disc_capacitor
+from .product_extract import extract_batch
+from .token_manager import TokenManager
+from .rate_limiter import get_rate_limiter
+from .library_generator import render_part, LibraryBatch, CAPACITOR_CONFIGS
+
+DEFAULT_WORKERS = 4
+
+# Same order as the radio buttons in DigikeyDialog
+POWER_OPTIONS = ["1/8", "1/4", "1/2", "1"]
+TOLERANCE_OPTIONS = ["0.1", "1", "2", "5"]
+
+# Batch row type -> capacitor tab key
+CAP_TYPES = {'alum': 'alum', 'disc': 'film', 'mica': 'mica'}
+
+REPORT_FIELDS = ["row", "type", "value", "status", "message", "mpn", "dk_part", "price"]
+
+def load_credentials():
+    client_id = os.environ.get("DIGIKEY_CLIENT_ID")
+    client_secret = os.environ.get("DIGIKEY_CLIENT_SECRET")
+    if client_id and client_secret:
+        return client_id, client_secret
+
+    config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json")
+    if os.path.exists(config_path):
+        with open(config_path, 'r') as f:
+            config = json.load(f)
+        return config.get("DIGIKEY_CLIENT_ID"), config.get("DIGIKEY_CLIENT_SECRET")
+    return None, None
+
+def read_parts(path):
+    if path.lower().endswith(".json"):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        return [{k.strip().lower(): (v or "").strip() for k, v in row.items() if k} for row in csv.DictReader(f)]
+
+def _option_index(value, options, field):
+    clean = value.lower().replace("watt", "").replace("w", "").replace("%", "").replace("±", "").replace("+-", "").strip()
+    if clean.startswith("."):
+        clean = "0" + clean
+    if clean not in options:
+        raise ValueError(f"Unsupported {field} '{value}', expected one of {', '.join(options)}")
+    return options.index(clean)
+
+def pick_cheapest_in_stock(results):
+    products = results.get("Products", [])
+    # A free part is the cheapest there is, only a missing price ranks last
+    in_stock = [(float("inf") if fields.price is None else fields.price, i)
+                for i, fields in enumerate(extract_batch(products, "listing")) if (fields.stock or 0) > 0]
+    if not in_stock:
+        return None
+    return products[min(in_stock)[1]]
+
+def search_and_process(part, tokens):
+    """
+    Returns (processed_data, product) for one batch row.
+    """
+    part_type = str(part.get("type", "")).lower()
+    value = str(part.get("value", ""))
+    rating = str(part.get("rating", ""))
+    def token():
+        # Only called on a cache miss
+        access_token = tokens.get()
+        if not access_token:
+            raise RuntimeError("Could not get a DigiKey access token")
+        return access_token
+    refresher = lambda: tokens.get(force_refresh=True)
+
+    if part_type == "resistor":
+        pwr_idx = _option_index(rating, POWER_OPTIONS, "power")
+        tol_idx = _option_index(str(part.get("tolerance") or "5%"), TOLERANCE_OPTIONS, "tolerance")
+        results = search_tht_resistor(value, pwr_idx, tol_idx, token, tokens.client_id, refresher)
+        processor = process_resistor
+    elif part_type in CAP_TYPES:
+        cat_id, lib_config = CAPACITOR_CONFIGS[CAP_TYPES[part_type]]
+        cap_val = value.replace("u", "µ")
+        vol_str = rating or "I don't care"
+        if cat_id == '60':
+            results = search_tht_disc_capacitor(cap_val, vol_str, cat_id, token, tokens.client_id, refresher)
+        else:
+            type_idx = 0 if str(part.get("package") or "radial").lower() == "axial" else 1
+            results = search_tht_capacitor(cap_val, vol_str, type_idx, cat_id, token, tokens.client_id, refresher)
+        if lib_config.get('proc') == 'disc':
+            processor = lambda p: process_disc_capacitor(p, lib_config)
+        else:
+            processor = lambda p: process_capacitor(p, lib_config)
+    else:
+        raise ValueError(f"Unknown part type '{part_type}'")
+
+    if results is None or "Products" not in results:
+        raise RuntimeError(f"API call failed: {results}")
+    product = pick_cheapest_in_stock(results)
+    if product is None:
+        raise LookupError("No in-stock results")
+    return processor(product), product
+
+def run_row(row_num, part, tokens):
+    """
+    Search, process and render one row. Returns (report, processed_data, rendered),
+    the last two are None when the row failed. A rendered row is "rendered" until the commit writes it.
+    """
+    report = {
+        "row": row_num,
+        "type": part.get("type", ""),
+        "value": part.get("value", ""),
+        "status": "failed",
+        "message": "",
+        "mpn": "",
+        "dk_part": "",
+        "price": ""
+    }
+    try:
+        processed_data, product = search_and_process(part, tokens)
+        sym_data = processed_data["Symbol Data"]
+        report["mpn"] = sym_data.get("mfrPart", "")
+        report["dk_part"] = sym_data.get("dkPart", "")
+        report["price"] = sym_data.get("price", "")
+        rendered = render_part(processed_data)
+        report["status"] = "rendered"
+        return report, processed_data, rendered
+    except Exception as e:
+        report["message"] = str(e)
+        return report, None, None
+
+def run_batch(parts, client_id, client_secret, workers=DEFAULT_WORKERS, progress=None):
+    """
+    Run every part through the pipeline. Returns one report dict per row, in input order.
+    Searching and rendering run on the pool, the libraries are then written in one commit each.
+    progress gets each row as it finishes on the pool, and the rendered rows again once the commit has written them.
+    """
+    tokens = TokenManager(client_id, client_secret)
+    batch = LibraryBatch()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run_row, i + 1, part, tokens): i for i, part in enumerate(parts)}
+        rows = [None] * len(parts)
+        for future in as_completed(futures):
+            rows[futures[future]] = future.result()
+            if progress:
+                progress(rows[futures[future]][0])
+
+    generated = []
+    for report, processed_data, rendered in rows:
+        if processed_data is not None:
+            batch.add(processed_data, rendered)
+            generated.append(report)
+    for report, (success, msg) in zip(generated, batch.commit()):
+        report["status"] = "ok" if success else "failed"
+        report["message"] = msg
+        if progress:
+            progress(report)
+
+    return [row[0] for row in rows]
+
+def write_report(reports, path):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+        writer.writeheader()
+        writer.writerows(reports)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate KiCad parts for a list of passives from DigiKey")
+    parser.add_argument("parts", help="CSV or JSON list of parts")
+    parser.add_argument("--report", default="batch_report.csv", help="Where to write the per-row report")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Parallel DigiKey searches")
+    args = parser.parse_args(argv)
+
+    client_id, client_secret = load_credentials()
+    if not (client_id and client_secret):
+        print("Set DIGIKEY_CLIENT_ID and DIGIKEY_CLIENT_SECRET or add them to config.json")
+        return 2
+
+    parts = read_parts(args.parts)
+    print(f"Starting with {get_rate_limiter().summary()}")
+    start = time.time()
+    report_line = lambda r: print(f"[{r['row']}] {r['type']} {r['value']}: {r['status']} {r['message']}")
+    reports = run_batch(parts, client_id, client_secret, workers=args.workers, progress=report_line)
+    write_report(reports, args.report)
+
+    ok = sum(1 for r in reports if r["status"] == "ok")
+    print(f"{ok}/{len(reports)} parts generated in {time.time() - start:.1f}s, report written to {args.report}")
+    print(get_rate_limiter().summary())
+    return 0 if ok == len(reports) else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,263 @@
+"""
+Benchmarks for the part pipeline, driven by the product JSON in benchmarks/fixtures.
+
+    python -m KicadCompMaker.benchmarks.bench_pipeline
+    python -m KicadCompMaker.benchmarks.bench_pipeline --save baselines/local.json
+    python -m KicadCompMaker.benchmarks.bench_pipeline --compare baselines/local.json
+
+Stages timed per part: extract (product_extract.extract alone), process (the whole process_* call, extract included),
+polygons (radial silkscreen only, built with cold caches), render (footprint + symbol templates) and generate (generate_library_files: footprint file, both symbol
+libraries and the manifest entries). The generate stage runs in a scratch folder against libraries and a manifest
+already holding 10, 1 000 and 10 000 parts. It also times the cold index scan of the library (scan) and a later
+session loading that index from the symbol index store instead (load).
+--compare checks every one of these numbers against the baseline.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+from contextlib import contextmanager
+from ..TH_Resistors import process_resistor
+from ..TH_Radial_ElectrolyticCapacitors import process_capacitor, capacitor_silkscreen, _capacitor_polygons
+from ..TH_Disc_Capacitors import process_disc_capacitor
+from ..template_registry import render
+from ..product_extract import extract
+from .. import library_generator, library_manifest, symbol_library
+from ..library_generator import generate_library_files
+from ..library_manifest import LibraryManifest
+from ..symbol_library import SymbolLibraryIndex, has_symbol
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURE_DIR = os.path.join(BENCH_DIR, "fixtures")
+
+LIBRARY_SIZES = [10, 1000, 10000]
+DEFAULT_ROUNDS = 200
+# A stage counts as regressed when its median is this much slower than the baseline
+REGRESSION_THRESHOLD = 0.25
+
+FAMILIES = {
+    "resistor": ("resistors.json", process_resistor),
+    "alum": ("alum.json", lambda p: process_capacitor(p, {'designator': 'CP', 'sym_lib': 'CP_TH_emDashGameChanger'})),
+    "disc": ("disc.json", lambda p: process_disc_capacitor(p, {'designator': 'C', 'sym_lib': 'C_TH_emDashGameChanger'}))
+}
+
+def load_products(fixture):
+    with open(os.path.join(FIXTURE_DIR, fixture), 'r', encoding='utf-8') as f:
+        return json.load(f)["Products"]
+
+def summarize(samples):
+    samples = sorted(samples)
+    n = len(samples)
+    return {
+        "count": n,
+        "mean_us": sum(samples) / n * 1e6,
+        "p50_us": samples[n // 2] * 1e6,
+        "p95_us": samples[min(n - 1, int(n * 0.95))] * 1e6
+    }
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+def bench_processing(rounds):
+    stages = {"extract": [], "process": [], "polygons": [], "render": []}
+    outlines = []
+    parts = 0
+    start = time.perf_counter()
+    for family, (fixture, processor) in FAMILIES.items():
+        products = load_products(fixture)
+        for _ in range(rounds):
+            for product in products:
+                data, elapsed = timed(processor, product)
+                stages["process"].append(elapsed)
+
+                if family == "alum" and len(outlines) < len(products):
+                    outlines.append((data["Footprint Data"]["diameter"], data["Footprint Data"]["pinPitch"]))
+
+                def render_both():
+                    render(data["fp_template"], data["Footprint Data"])
+                    return render(data["sym_template"], data["Symbol Data"])
+                _, elapsed = timed(render_both)
+                stages["render"].append(elapsed)
+                parts += 1
+    total = time.perf_counter() - start
+
+    # extract gets a pass of its own too, so the throughput above still counts every part once
+    for family, (fixture, _) in FAMILIES.items():
+        products = load_products(fixture)
+        for _ in range(rounds):
+            for product in products:
+                _, elapsed = timed(extract, product, family)
+                stages["extract"].append(elapsed)
+
+    # Both silkscreen layers are memoized, so the polygons are timed in a pass of their own with the caches
+    # cleared before every call. Clearing them during the loop above would make process_capacitor cold too.
+    for _ in range(rounds):
+        for diameter, pitch in outlines:
+            capacitor_silkscreen.cache_clear()
+            _capacitor_polygons.cache_clear()
+            _, elapsed = timed(capacitor_silkscreen, diameter, pitch)
+            stages["polygons"].append(elapsed)
+    return {name: summarize(s) for name, s in stages.items() if s}, parts / total
+
+def _seed_library(path, size, symbol_block, preamble):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(preamble)
+        for i in range(size):
+            f.write("\n" + symbol_block.replace('"__NAME__', f'"SEED_{i}') + "\n")
+        f.write(")")
+
+@contextmanager
+def _scratch_libraries(work_dir):
+    """
+    Point generate_library_files at libraries and a manifest in work_dir instead of KiCad's and the plugin's.
+    """
+    saved = (library_generator.footprint_lib_path, library_generator.symbol_lib_path,
+             library_generator.local_symbol_lib_path, library_manifest._manifest, symbol_library._index)
+    library_generator.footprint_lib_path = lambda name: os.path.join(work_dir, "footprints", f"{name}.pretty")
+    library_generator.symbol_lib_path = lambda name: os.path.join(work_dir, "symbols", f"{name}.kicad_sym")
+    library_generator.local_symbol_lib_path = lambda name: os.path.join(work_dir, "plugin", f"{name}.kicad_sym")
+    library_manifest._manifest = LibraryManifest(os.path.join(work_dir, "library_manifest.sqlite3"))
+    symbol_library._index = SymbolLibraryIndex(_index_store(work_dir))
+    try:
+        yield library_manifest._manifest
+    finally:
+        (library_generator.footprint_lib_path, library_generator.symbol_lib_path,
+         library_generator.local_symbol_lib_path, library_manifest._manifest, symbol_library._index) = saved
+
+def _index_store(work_dir):
+    return os.path.join(work_dir, "symbol_index.sqlite3")
+
+def _part(data, name):
+    part = dict(data, footprint_name=f"{name}.kicad_mod")
+    part["Symbol Data"] = dict(data["Symbol Data"], symbol=name)
+    return part
+
+def bench_generate(size, parts):
+    products = load_products("resistors.json")
+    data = dict(process_resistor(products[0]), sym_lib_name="bench", fp_lib_name="bench")
+    preamble = data.get("sym_preamble", library_generator.DEFAULT_SYM_PREAMBLE)
+    block = render(data["sym_template"], dict(data["Symbol Data"], symbol="__NAME__"))
+    rendered_fp = render(data["fp_template"], data["Footprint Data"])
+
+    work_dir = tempfile.mkdtemp(prefix="kcm_bench_")
+    try:
+        with _scratch_libraries(work_dir) as manifest:
+            libs = [library_generator.symbol_lib_path("bench"), library_generator.local_symbol_lib_path("bench")]
+            os.makedirs(library_generator.footprint_lib_path("bench"))
+            for lib_path in libs:
+                os.makedirs(os.path.dirname(lib_path))
+                _seed_library(lib_path, size, block, preamble)
+            with manifest.batch():
+                for i in range(size):
+                    seed = _part(data, f"SEED_{i}")
+                    manifest.record_footprint(os.path.join(library_generator.footprint_lib_path("bench"), seed["footprint_name"]),
+                                              data["fp_template"], seed["Footprint Data"])
+                    for lib_path in libs:
+                        manifest.record_symbol(lib_path, seed["Symbol Data"]["symbol"], data["sym_template"], seed["Symbol Data"], preamble)
+
+            _, scan = timed(has_symbol, libs[0], "SEED_0")
+            has_symbol(libs[1], "SEED_0")
+            # A new session: the offsets come from the store
+            symbol_library._index = SymbolLibraryIndex(_index_store(work_dir))
+            _, load = timed(has_symbol, libs[0], "SEED_0")
+            has_symbol(libs[1], "SEED_0")
+            samples = []
+            for i in range(parts):
+                part = _part(data, f"BENCH_{i}")
+                rendered = {"footprint": rendered_fp, "symbol": block.replace('"__NAME__', f'"BENCH_{i}')}
+                (ok, message), elapsed = timed(generate_library_files, part, rendered)
+                if not ok:
+                    raise RuntimeError(message)
+                samples.append(elapsed)
+        result = summarize(samples)
+        result["index_scan_us"] = scan * 1e6
+        result["index_load_us"] = load * 1e6
+        return result
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def run(rounds=DEFAULT_ROUNDS, parts=100):
+    stages, throughput = bench_processing(rounds)
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.platform(),
+        "throughput_parts_per_sec": throughput,
+        "stages": stages,
+        "generate": {str(size): bench_generate(size, parts) for size in LIBRARY_SIZES}
+    }
+
+def _timings(results):
+    """
+    {name: microseconds} for every timing in a result, lower is better.
+    """
+    timings = {name: stats["p50_us"] for name, stats in results.get("stages", {}).items()}
+    for size, stats in results.get("generate", {}).items():
+        timings[f"generate@{size}"] = stats["p50_us"]
+        timings[f"scan@{size}"] = stats["index_scan_us"]
+        if "index_load_us" in stats:
+            timings[f"load@{size}"] = stats["index_load_us"]
+    return timings
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """
+    Returns a list of human readable regressions, empty when nothing got slower than threshold.
+    A timing the baseline has but the results lack counts as a regression too, so a stage can not drop out unnoticed.
+    """
+    regressions = []
+    current = _timings(results)
+    for name, old in _timings(baseline).items():
+        new = current.get(name)
+        if new is None:
+            regressions.append(f"{name}: in the baseline but not measured")
+            continue
+        if not old:
+            continue
+        ratio = new / old
+        if ratio > 1 + threshold:
+            regressions.append(f"{name}: {old:.1f}us -> {new:.1f}us ({ratio:.2f}x)")
+    old_tp = baseline.get("throughput_parts_per_sec")
+    if old_tp and results["throughput_parts_per_sec"] < old_tp / (1 + threshold):
+        regressions.append(f"throughput: {old_tp:.0f} -> {results['throughput_parts_per_sec']:.0f} parts/sec")
+    return regressions
+
+def print_report(results):
+    print(f"Throughput: {results['throughput_parts_per_sec']:.0f} parts/sec")
+    for name, s in results["stages"].items():
+        print(f"  {name:<10} mean {s['mean_us']:9.1f}us  p50 {s['p50_us']:9.1f}us  p95 {s['p95_us']:9.1f}us")
+    for size, s in results["generate"].items():
+        print(f"  generate@{size:<6} mean {s['mean_us']:9.1f}us  p50 {s['p50_us']:9.1f}us  p95 {s['p95_us']:9.1f}us  scan {s['index_scan_us']:.0f}us  load {s['index_load_us']:.0f}us")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark extract, process_*, polygon generation, rendering and library writes")
+    parser.add_argument("--rounds", type=int, default=DEFAULT_ROUNDS, help="Passes over each fixture")
+    parser.add_argument("--parts", type=int, default=100, help="Parts generated per library size")
+    parser.add_argument("--save", help="Write the results as a JSON baseline")
+    parser.add_argument("--compare", help="Baseline JSON to check for regressions")
+    args = parser.parse_args(argv)
+
+    results = run(args.rounds, args.parts)
+    print_report(results)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.save}")
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
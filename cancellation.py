@@ -0,0 +1,110 @@
+import time
+import threading
+import collections
+
+class SearchCancelled(Exception):
+    pass
+
+class DeadlineExceeded(SearchCancelled):
+    pass
+
+class SearchControl:
+    """
+    Cancel flag and deadline for one search. The worker activates it for its thread,
+    and the HTTP, retry and rate limit waits below check it between steps.
+    phase is what the search is doing right now, set by perf_log spans and shown by its progress dialog.
+    Every thread working on the search (the fan-out runs one per variant) keeps its own stack of phases,
+    so a thread only ever ends its own spans and phase is that of the thread that last started one.
+    """
+    def __init__(self, deadline=None):
+        self.event = threading.Event()
+        self.phases = collections.OrderedDict() # thread ident -> phases of the spans running on it
+        self.phase_lock = threading.Lock()
+        self.deadline_seconds = deadline
+        self.deadline = None if deadline is None else time.monotonic() + deadline
+
+    @property
+    def phase(self):
+        with self.phase_lock:
+            if not self.phases:
+                return None
+            return next(reversed(self.phases.values()))[-1]
+
+    def enter_phase(self, phase):
+        ident = threading.get_ident()
+        with self.phase_lock:
+            self.phases.setdefault(ident, []).append(phase)
+            self.phases.move_to_end(ident)
+
+    def exit_phase(self):
+        ident = threading.get_ident()
+        with self.phase_lock:
+            stack = self.phases.get(ident)
+            if stack:
+                stack.pop()
+                if not stack:
+                    del self.phases[ident]
+
+    def cancel(self):
+        self.event.set()
+
+    @property
+    def cancelled(self):
+        return self.event.is_set()
+
+    def remaining(self):
+        """
+        Seconds left before the deadline, None without one.
+        """
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def check(self):
+        if self.event.is_set():
+            raise SearchCancelled("Search cancelled")
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            raise DeadlineExceeded(f"DigiKey did not answer within {self.deadline_seconds:.3g} s")
+
+    def wait(self, seconds):
+        """
+        Sleep that wakes up early on cancel and never runs past the deadline.
+        """
+        remaining = self.remaining()
+        if remaining is not None:
+            seconds = min(seconds, remaining)
+        self.event.wait(seconds)
+
+    def clamp(self, timeout):
+        """
+        A requests timeout, (connect, read) or seconds, cut down to what is left of the deadline.
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return timeout
+        remaining = max(remaining, 0.1)
+        if isinstance(timeout, tuple):
+            return tuple(min(t, remaining) for t in timeout)
+        return min(timeout, remaining)
+
+_local = threading.local()
+
+def current_control():
+    return getattr(_local, "control", None)
+
+class activate:
+    """
+    with activate(control): ... makes control the current one for this thread.
+    """
+    def __init__(self, control):
+        self.control = control
+        self.previous = None
+
+    def __enter__(self):
+        self.previous = current_control()
+        _local.control = self.control
+        return self.control
+
+    def __exit__(self, exc_type, exc, tb):
+        _local.control = self.previous
+        return False
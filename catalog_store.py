@@ -0,0 +1,304 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+from .digikey_client import keyword_search, iter_search_pages, PAGE_SIZE
+from .product_extract import extract, extract_batch
+from .product_records import product_key
+
+PLUGIN_DIR = os.path.dirname(os.path.abspath(__file__))
+CATALOG_PATH = os.path.join(PLUGIN_DIR, "catalog.sqlite3")
+
+# Mirrored DigiKey categories: category id -> (top level category id, keyword, product_extract family)
+CATALOG_CATEGORIES = {
+    "53": ("2", "resistor", "resistor"),  # Through hole resistors
+    "58": ("3", "capacitor", "alum"),     # Aluminum electrolytic
+    "60": ("3", "capacitor", "disc"),     # Ceramic disc
+    "61": ("3", "capacitor", "disc")      # Mica / PTFE
+}
+# Pages fetched per category on each refresh, the next refresh carries on from there
+SYNC_PAGES = 40
+# A refresh starts this far before where the last one stopped, so parts listed since then
+# do not push unseen ones back past the offset. Re-reading a few is harmless, rows are replaced.
+RESUME_OVERLAP = PAGE_SIZE
+# Older than this and the results are flagged as stale
+STALE_AFTER = 7 * 24 * 3600
+
+# Same order as the radio buttons in DigikeyDialog
+POWER_WATTS = [0.125, 0.25, 0.5, 1.0]
+TOLERANCE_PCT = [0.1, 1.0, 2.0, 5.0]
+
+# Axial / Radial and the disc package filters used by the live searches (ParameterId 16 and 69)
+CAP_TYPE_IDS = ["317190", "392320"]
+DISC_PACKAGE_IDS = ("392278", "392342")
+DISC_MOUNT_ID = "411897"
+
+SI_PREFIX = {"p": 1e-12, "n": 1e-9, "µ": 1e-6, "u": 1e-6, "m": 1e-3, "": 1.0, "k": 1e3, "K": 1e3, "M": 1e6, "G": 1e9}
+VALUE_RE = re.compile(r'([\d\.]+)\s*([pnµumkKMG]?)')
+FRACTION_W_RE = re.compile(r'(\d+)/(\d+)\s*W')
+DECIMAL_W_RE = re.compile(r'(?<![\d\./])(\d+(?:\.\d+)?|\.\d+)\s*W')
+PERCENT_RE = re.compile(r'([\d\.]+)\s*%')
+MM_RE = re.compile(r'([\d\.]+)\s*mm')
+
+def parse_si(text):
+    """
+    "10 kOhms" -> 10000.0, "100 µF" -> 0.0001, "25 V" -> 25.0. None when there is no number.
+    """
+    if not text:
+        return None
+    match = VALUE_RE.search(text)
+    if not match:
+        return None
+    try:
+        return float(match.group(1)) * SI_PREFIX.get(match.group(2), 1.0)
+    except ValueError:
+        return None
+
+def parse_watts(text):
+    if not text:
+        return None
+    # Fraction first, otherwise the 4 of "1/4W" reads as 4 W
+    match = FRACTION_W_RE.search(text)
+    if match:
+        return float(match.group(1)) / float(match.group(2))
+    match = DECIMAL_W_RE.search(text)
+    if match:
+        return float(match.group(1))
+    return None
+
+def parse_percent(text):
+    match = PERCENT_RE.search(text or "")
+    return float(match.group(1)) if match else None
+
+def parse_mm(text):
+    match = MM_RE.search(text or "")
+    return float(match.group(1)) if match else None
+
+def _known(value):
+    return None if value == "Unknown" else value
+
+def product_row(product, category, fields=None):
+    """
+    The catalog columns for a product, fields is its record from product_extract for the category's family.
+    """
+    if fields is None:
+        fields = extract(product, CATALOG_CATEGORIES[category][2])
+    field = lambda name: _known(getattr(fields, name, None))
+    return {
+        # Same key as the result list and the fan-out dedup
+        "key": product_key(product),
+        "category": category,
+        "mpn": field("mpn") or "",
+        "resistance": parse_si(field("resistance")),
+        "capacitance": parse_si(field("capacitance")),
+        "voltage": parse_si(field("voltage")),
+        "tolerance": parse_percent(field("tolerance")),
+        "power": parse_watts(field("power")),
+        "lead_spacing": parse_mm(field("lead_spacing")),
+        "type_id": str(field("type_id") or ""),
+        "mount_id": str(field("mount_id") or ""),
+        # Not the record's price, which the processors default for display, an unpriced part stays NULL here
+        "price": product.get("UnitPrice"),
+        "stock": fields.stock or 0,
+        "product": json.dumps(product, ensure_ascii=False)
+    }
+
+ROW_COLUMNS = ["key", "category", "mpn", "resistance", "capacitance", "voltage", "tolerance", "power",
+               "lead_spacing", "type_id", "mount_id", "price", "stock", "product"]
+
+class CatalogStore:
+    def __init__(self, path=CATALOG_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS products ("
+                "key TEXT PRIMARY KEY, category TEXT, mpn TEXT, resistance REAL, capacitance REAL, "
+                "voltage REAL, tolerance REAL, power REAL, lead_spacing REAL, type_id TEXT, mount_id TEXT, "
+                "price REAL, stock INTEGER, product TEXT, updated REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_res ON products(category, resistance, power, tolerance)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_cap ON products(category, capacitance, voltage)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_spacing ON products(category, lead_spacing)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_price ON products(category, price)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sync_state ("
+                "category TEXT PRIMARY KEY, next_offset INTEGER, last_sync REAL, last_full_sync REAL, total INTEGER)"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def upsert(self, category, products):
+        now = time.time()
+        family = CATALOG_CATEGORIES[category][2]
+        rows = [product_row(p, category, fields) for p, fields in zip(products, extract_batch(products, family))]
+        placeholders = ", ".join("?" for _ in range(len(ROW_COLUMNS) + 1))
+        with self.lock, self._connect() as conn:
+            conn.executemany(
+                f"INSERT OR REPLACE INTO products ({', '.join(ROW_COLUMNS)}, updated) VALUES ({placeholders})",
+                [tuple(r[c] for c in ROW_COLUMNS) + (now,) for r in rows]
+            )
+        return len(rows)
+
+    def sync_state(self, category):
+        with self._connect() as conn:
+            row = conn.execute("SELECT next_offset, last_sync, last_full_sync, total FROM sync_state WHERE category = ?",
+                               (category,)).fetchone()
+        if row is None:
+            return {"next_offset": 0, "last_sync": None, "last_full_sync": None, "total": None}
+        return dict(zip(("next_offset", "last_sync", "last_full_sync", "total"), row))
+
+    def _save_sync_state(self, category, state):
+        with self.lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sync_state (category, next_offset, last_sync, last_full_sync, total) VALUES (?, ?, ?, ?, ?)",
+                (category, state["next_offset"], state["last_sync"], state["last_full_sync"], state["total"])
+            )
+
+    def age(self, category):
+        """
+        Seconds since the category was last refreshed, None when it never was.
+        """
+        last_sync = self.sync_state(category)["last_sync"]
+        return None if last_sync is None else time.time() - last_sync
+
+    def sync_category(self, category, access_token, client_id, token_refresher=None, max_pages=SYNC_PAGES):
+        """
+        Fetch up to max_pages more pages of a category, carrying on from where the last sync stopped.
+        Returns the number of products stored.
+
+        The listing is walked in DigiKey part number order, which price and stock changes do not reorder.
+        A pass over the whole category can take several refreshes. When one reaches the end, the rows it
+        did not see, those last stored before the previous pass ended, are delisted or out of stock and removed.
+        """
+        parent_id, keyword, _ = CATALOG_CATEGORIES[category]
+        state = self.sync_state(category)
+        start = max(0, (state["next_offset"] or 0) - RESUME_OVERLAP)
+
+        def search_page(offset):
+            payload = {
+                "Keywords": keyword,
+                "Limit": PAGE_SIZE,
+                "Offset": start + offset,
+                "MinimumQuantityAvailable": 1,
+                "FilterOptionsRequest": {
+                    "MinimumOrderQuantity": 1,
+                    "CategoryFilter": [{"id": parent_id}],
+                    "MarketPlaceFilter": "ExcludeMarketPlace",
+                    "ParameterFilterRequest": {"CategoryFilter": {"id": category}, "ParameterFilters": []},
+                    "SearchOptions": ["NormallyStocking"]
+                },
+                "ExcludedContent": ["FilterOptions"],
+                "SortOptions": {"Field": "DigiKeyProductNumber", "SortOrder": "Ascending"}
+            }
+            return keyword_search(payload, access_token, client_id, token_refresher)
+
+        first_page = search_page(0)
+        if not first_page or "Products" not in first_page:
+            raise RuntimeError(f"Catalog sync failed for category {category}: {first_page}")
+        # ProductsCount is the whole category, iter_search_pages counts from our start offset
+        remaining = max(0, first_page.get("ProductsCount", 0) - start)
+        first_page = dict(first_page, ProductsCount=remaining)
+
+        stored = 0
+        for products in iter_search_pages(search_page, max_pages * PAGE_SIZE, first_page=first_page):
+            stored += self.upsert(category, products)
+
+        now = time.time()
+        state["total"] = start + remaining
+        state["last_sync"] = now
+        if start + stored >= state["total"]:
+            # Reached the end of the category, start over next time
+            self._prune(category, state["last_full_sync"])
+            state["next_offset"] = 0
+            state["last_full_sync"] = now
+        else:
+            state["next_offset"] = start + stored
+        self._save_sync_state(category, state)
+        return stored
+
+    def _prune(self, category, pass_started):
+        """
+        Remove the rows a full pass over the category did not store again. Nothing is removed after the first pass.
+        """
+        if pass_started is None:
+            return 0
+        with self.lock, self._connect() as conn:
+            return conn.execute("DELETE FROM products WHERE category = ? AND updated < ?", (category, pass_started)).rowcount
+
+    def query(self, category, where, args, limit=PAGE_SIZE, offset=0):
+        """
+        Answer a search from the mirror, shaped like a DigiKey keyword search response.
+        """
+        sql_where = " AND ".join(["category = ?", "stock > 0"] + where)
+        with self._connect() as conn:
+            total = conn.execute(f"SELECT COUNT(*) FROM products WHERE {sql_where}", [category] + args).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT product FROM products WHERE {sql_where} ORDER BY price IS NULL, price ASC LIMIT ? OFFSET ?",
+                [category] + args + [limit, offset]
+            ).fetchall()
+        age = self.age(category)
+        return {
+            "ProductsCount": total,
+            "Products": [json.loads(r[0]) for r in rows],
+            "Offline": True,
+            "CatalogAge": age,
+            "CatalogStale": age is None or age > STALE_AFTER
+        }
+
+def _close_to(column, value, where, args):
+    # Parsed values are floats, compare with a relative tolerance instead of equality
+    where.append(f"{column} BETWEEN ? AND ?")
+    args += [value * 0.999, value * 1.001]
+
+def query_resistors(store, res_str, power_idx, tolerance_idx, offset=0):
+    where, args = [], []
+    resistance = parse_si(res_str)
+    if resistance is not None:
+        _close_to("resistance", resistance, where, args)
+    _close_to("power", POWER_WATTS[power_idx] if power_idx < len(POWER_WATTS) else POWER_WATTS[0], where, args)
+    _close_to("tolerance", TOLERANCE_PCT[tolerance_idx] if tolerance_idx < len(TOLERANCE_PCT) else TOLERANCE_PCT[-1], where, args)
+    return store.query("53", where, args, offset=offset)
+
+def query_capacitors(store, cat_id, cap_str, vol_str, type_idx=None, offset=0, lead_spacing_mm=None):
+    cat_id = str(cat_id)
+    where, args = [], []
+    capacitance = parse_si(cap_str)
+    if capacitance is not None:
+        _close_to("capacitance", capacitance, where, args)
+    if vol_str:
+        voltage = parse_si(vol_str)
+        if voltage is not None:
+            _close_to("voltage", voltage, where, args)
+    if lead_spacing_mm is not None:
+        _close_to("lead_spacing", lead_spacing_mm, where, args)
+    if cat_id == "60":
+        where.append("mount_id = ?")
+        args.append(DISC_MOUNT_ID)
+        where.append(f"type_id IN ({', '.join('?' for _ in DISC_PACKAGE_IDS)})")
+        args += list(DISC_PACKAGE_IDS)
+    elif type_idx is not None:
+        where.append("type_id = ?")
+        args.append(CAP_TYPE_IDS[0] if type_idx == 0 else CAP_TYPE_IDS[1])
+    return store.query(cat_id, where, args, offset=offset)
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_catalog_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = CatalogStore()
+        return _store
+
+def sync_catalog(access_token, client_id, token_refresher=None, categories=None, max_pages=SYNC_PAGES):
+    """
+    Refresh every mirrored category, returns {category: products stored}.
+    """
+    store = get_catalog_store()
+    return {cat: store.sync_category(cat, access_token, client_id, token_refresher, max_pages)
+            for cat in (categories or CATALOG_CATEGORIES)}
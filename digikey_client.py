@@ -0,0 +1,177 @@
+import time
+import random
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from .rate_limiter import get_rate_limiter
+from .perf_log import span
+from .cancellation import current_control
+
+TOKEN_URL = "https://api.digikey.com/v1/oauth2/token"
+KEYWORD_SEARCH_URL = "https://api.digikey.com/products/v4/search/keyword"
+
+# (connect, read) in seconds
+TIMEOUT = (5, 30)
+
+# Retry policy for 429 and 5xx responses and dropped connections
+MAX_RETRIES = 4
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+POOL_SIZE = 8
+
+# DigiKey caps keyword searches at 50 products per call
+PAGE_SIZE = 50
+PAGE_WORKERS = 4
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """
+    One keep-alive session shared by every DigiKey call so the TCP/TLS handshake is paid once.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+            session.mount("https://", adapter)
+            session.headers.update({"Accept-Encoding": "gzip, deflate", "Accept": "application/json"})
+            _session = session
+        return _session
+
+def _retry_delay(attempt, response=None):
+    # Honour Retry-After when DigiKey sends one, otherwise exponential backoff with jitter
+    if response is not None:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            try:
+                return min(float(retry_after), BACKOFF_MAX)
+            except ValueError:
+                pass
+    delay = min(BACKOFF_BASE * (2 ** attempt), BACKOFF_MAX)
+    return delay * (0.5 + random.random() / 2)
+
+def request(method, url, timeout=TIMEOUT, max_retries=MAX_RETRIES, limiter=None, **kwargs):
+    """
+    Send a request through the shared session, retrying 429/5xx and connection errors.
+    With a limiter every attempt waits for a slot first and the response headers feed its limits.
+    The last response is returned once retries run out, the last exception is raised if none came back.
+    Under an active SearchControl every step checks for cancel and the timeouts never run past its deadline.
+    """
+    session = get_session()
+    control = current_control()
+    sleep = time.sleep if control is None else control.wait
+    for attempt in range(max_retries + 1):
+        if control is not None:
+            control.check()
+        if limiter is not None:
+            limiter.acquire(timeout=None if control is None else control.remaining())
+        try:
+            response = session.request(method, url, timeout=timeout if control is None else control.clamp(timeout), **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if control is not None:
+                control.check()
+            if attempt == max_retries:
+                raise
+            print(f"DigiKey request failed ({e}), retrying")
+            sleep(_retry_delay(attempt))
+            continue
+
+        if limiter is not None:
+            limiter.update(response.headers)
+        if response.status_code in RETRY_STATUS and attempt < max_retries:
+            delay = _retry_delay(attempt, response)
+            if limiter is not None and response.status_code == 429:
+                # Hold every caller, not just this one, the limiter does the waiting
+                limiter.penalize(delay)
+            else:
+                sleep(delay)
+            continue
+        return response
+
+def fetch_token(client_id, client_secret):
+    """
+    Client credentials grant. Returns the decoded token response or None.
+    """
+    payload = {
+        "client_id": client_id,
+        "client_secret": client_secret,
+        "grant_type": "client_credentials"
+    }
+    headers = {"content-type": "application/x-www-form-urlencoded"}
+    with span("token_fetch", phase="Getting a DigiKey token") as s:
+        # Same limiter as the searches, so a 429 on the token call holds everyone back too
+        response = request("POST", TOKEN_URL, data=payload, headers=headers, limiter=get_rate_limiter())
+        s.set(status=response.status_code)
+    if response.status_code == 200:
+        return response.json()
+    print(f"Token Error: {response.text}")
+    return None
+
+def keyword_search(payload, access_token, client_id, token_refresher=None):
+    """
+    access_token may be a callable returning the token. It is only called here, when the search really goes
+    to DigiKey, so a cached search never waits on OAuth. Returns None when it has no token to give.
+    """
+    if callable(access_token):
+        access_token = access_token()
+        if not access_token:
+            print("Keyword search skipped: no DigiKey token")
+            return None
+    headers = {
+        "x-digikey-client-id": client_id,
+        "content-type": "application/json",
+        "authorization": f"Bearer {access_token}"
+    }
+    limiter = get_rate_limiter()
+    with span("http", phase="Waiting for DigiKey", offset=payload.get("Offset")) as s:
+        response = request("POST", KEYWORD_SEARCH_URL, json=payload, headers=headers, limiter=limiter)
+
+        if response.status_code == 401 and token_refresher:
+            new_token = token_refresher()
+            if new_token:
+                headers["authorization"] = f"Bearer {new_token}"
+                response = request("POST", KEYWORD_SEARCH_URL, json=payload, headers=headers, limiter=limiter)
+        s.set(status=response.status_code)
+
+    with span("decode", phase="Decoding the response") as s:
+        s.set(bytes=len(response.content))
+        return response.json()
+
+def iter_search_pages(search_page, max_results, first_page=None, workers=PAGE_WORKERS):
+    """
+    Yield the product lists of a search page by page, up to max_results products.
+    search_page(offset) returns one decoded response. Page 1 is yielded as soon as it is in,
+    the rest are fetched concurrently and yielded in offset order so the price sort holds.
+    """
+    if first_page is None:
+        first_page = search_page(0)
+    if not first_page:
+        return
+
+    products = first_page.get("Products", [])[:max_results]
+    yield products
+
+    total = min(first_page.get("ProductsCount", 0), max_results)
+    offsets = range(PAGE_SIZE, total, PAGE_SIZE)
+    if not offsets:
+        return
+
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = [(offset, pool.submit(search_page, offset)) for offset in offsets]
+        for offset, future in futures:
+            try:
+                page = future.result()
+            except Exception as e:
+                print(f"Page at offset {offset} failed: {e}")
+                return
+            if not page or not page.get("Products"):
+                return
+            yield page["Products"][:total - offset]
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
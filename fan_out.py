@@ -0,0 +1,86 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from .cancellation import DeadlineExceeded
+from .product_records import ProductRecord, product_key, VARIANT_KEY
+
+def _price(product):
+    price = product.get("UnitPrice")
+    return float("inf") if price is None else price
+
+def merge_results(tagged_results, sources=None):
+    """
+    One search response out of [(variant, response)], de-duplicated by DigiKey PN and sorted by price.
+    The first variant to return a product keeps it. Failed variants (None) are listed under FailedVariants,
+    and when every variant failed the result is None like a single failed search.
+    With sources ({variant: search}) the products come back as ProductRecords loading from those searches.
+    """
+    merged = {}
+    total = 0
+    counts = {}
+    failed = []
+    for variant, result in tagged_results:
+        if not isinstance(result, dict) or "Products" not in result:
+            failed.append(variant)
+            continue
+        total += result.get("ProductsCount", 0)
+        counts[variant] = len(result["Products"])
+        for index, product in enumerate(result["Products"]):
+            key = product_key(product)
+            if key in merged:
+                continue
+            if sources is None:
+                merged[key] = dict(product, **{VARIANT_KEY: variant})
+            else:
+                record = ProductRecord.from_product(product, index, variant)
+                record.source = sources[variant]
+                merged[key] = record
+
+    if not counts:
+        return None
+    price = _price if sources is None else (lambda r: float("inf") if r.price is None else r.price)
+    products = sorted(merged.values(), key=price)
+    return {"ProductsCount": total, "Products": products, "Variants": counts, "FailedVariants": failed}
+
+def fan_out_search(variants, sources=None, control=None):
+    """
+    Run every (variant, search) pair at once and merge the first pages.
+    Wall clock time is that of the slowest search, not the sum.
+    With sources ({variant: search_page(offset)}) the merged products are ProductRecords loading from them.
+    With a SearchControl the merge happens as soon as it is cancelled or past its deadline, using the
+    variants that are in by then; the others are listed in FailedVariants as timed out.
+    """
+    if not variants:
+        return None
+    pool = ThreadPoolExecutor(max_workers=len(variants))
+    try:
+        futures = {pool.submit(search): variant for variant, search in variants}
+        pending = set(futures)
+        while pending:
+            timeout = None
+            if control is not None:
+                remaining = control.remaining()
+                if control.cancelled or remaining == 0:
+                    break
+                # Short waits so a cancel is noticed without waiting on the slowest variant
+                timeout = 0.25 if remaining is None else min(0.25, remaining)
+            _, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+    finally:
+        # Stragglers finish on their own, nobody waits for them
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    if control is not None and control.cancelled:
+        control.check()
+
+    tagged = []
+    for future, variant in futures.items():
+        if future in pending:
+            tagged.append((f"{variant} (timed out)", None))
+            continue
+        try:
+            tagged.append((variant, future.result()))
+        except Exception as e:
+            print(f"Fan out search {variant} failed: {e}")
+            tagged.append((variant, None))
+    merged = merge_results(tagged, sources)
+    if merged is None and pending:
+        raise DeadlineExceeded("None of the searches finished in time")
+    return merged
@@ -0,0 +1,93 @@
+import os
+import re
+import math
+import itertools
+import threading
+
+# Footprint file names carry their key dimensions, one pattern per family
+NAME_PATTERNS = {
+    "R": re.compile(r'^R_L([\d\.]+)mm_D([\d\.]+)mm_P([\d\.]+)mm\.kicad_mod$'),
+    "CP": re.compile(r'^CP_D([\d\.]+)mm_P([\d\.]+)mm_H([\d\.]+)mm\.kicad_mod$'),
+    "C": re.compile(r'^C_D([\d\.]+)mm_W([\d\.]+)mm_P([\d\.]+)mm\.kicad_mod$')
+}
+
+DEFAULT_TOLERANCE = 0.1 # mm, on every dimension
+
+def footprint_key(file_name):
+    """
+    (family, dims) for a generated footprint file name, or None for anything else.
+    """
+    for family, pattern in NAME_PATTERNS.items():
+        match = pattern.match(file_name)
+        if match:
+            try:
+                return family, tuple(float(g) for g in match.groups())
+            except ValueError:
+                return None
+    return None
+
+class FootprintIndex:
+    """
+    Grid-bucketed index of the generated footprints in each .pretty folder.
+    Cells are one tolerance wide, so a lookup only checks the neighbouring cells of the query.
+    """
+    def __init__(self, cell_size=DEFAULT_TOLERANCE):
+        self.cell_size = cell_size
+        self.libs = {} # lib path -> {(family, cell): [(dims, file name)]}
+        self.lock = threading.Lock()
+
+    def _cell(self, dims):
+        return tuple(math.floor(d / self.cell_size) for d in dims)
+
+    def _add(self, buckets, file_name):
+        key = footprint_key(file_name)
+        if key is None:
+            return
+        family, dims = key
+        bucket = buckets.setdefault((family, self._cell(dims)), [])
+        if (dims, file_name) not in bucket:
+            bucket.append((dims, file_name))
+
+    def _buckets(self, lib_path):
+        buckets = self.libs.get(lib_path)
+        if buckets is None:
+            buckets = {}
+            if os.path.isdir(lib_path):
+                for entry in os.scandir(lib_path):
+                    self._add(buckets, entry.name)
+            self.libs[lib_path] = buckets
+        return buckets
+
+    def add(self, lib_path, file_name):
+        with self.lock:
+            self._add(self._buckets(lib_path), file_name)
+
+    def nearest(self, lib_path, file_name, tolerance=DEFAULT_TOLERANCE):
+        """
+        Closest existing footprint of the same family with every dimension within tolerance,
+        as (file name, max difference), or None. An exact name match is never returned.
+        """
+        key = footprint_key(file_name)
+        if key is None:
+            return None
+        family, dims = key
+        reach = max(1, math.ceil(tolerance / self.cell_size))
+        base = self._cell(dims)
+
+        best = None
+        with self.lock:
+            buckets = self._buckets(lib_path)
+            for offset in itertools.product(range(-reach, reach + 1), repeat=len(dims)):
+                cell = tuple(b + o for b, o in zip(base, offset))
+                for other_dims, other_name in buckets.get((family, cell), ()):
+                    if other_name == file_name:
+                        continue
+                    diff = max(abs(a - b) for a, b in zip(dims, other_dims))
+                    if diff <= tolerance and (best is None or diff < best[1]):
+                        best = (other_name, diff)
+        return best
+
+_index = FootprintIndex()
+
+def get_footprint_index():
+    return _index
@@ -0,0 +1,81 @@
+from .sexpr import parse
+
+# Layers worth drawing in the preview, anything else is skipped
+PREVIEW_LAYERS = ("F.SilkS", "F.Fab", "F.CrtYd")
+
+def _child(node, name):
+    for item in node[1:]:
+        if isinstance(item, list) and item and item[0] == name:
+            return item
+    return None
+
+def _xy(node, name):
+    item = _child(node, name)
+    if item is None:
+        return None
+    return float(item[1]), float(item[2])
+
+def footprint_shapes(rendered_fp):
+    """
+    The drawable parts of a rendered .kicad_mod as simple tuples:
+        ("line", layer, (x1, y1), (x2, y2))
+        ("rect", layer, (x1, y1), (x2, y2))
+        ("circle", layer, center, point_on_circle)
+        ("poly", layer, [points])
+        ("pad", shape, (x, y), (w, h))
+    """
+    shapes = []
+    tree = parse(rendered_fp)
+    if not tree or not isinstance(tree[0], list):
+        return shapes
+    for node in tree[0][1:]:
+        if not isinstance(node, list) or not node:
+            continue
+        kind = node[0]
+        if kind == "pad":
+            at = _xy(node, "at")
+            size = _xy(node, "size")
+            if at and size:
+                shapes.append(("pad", node[3] if len(node) > 3 else "circle", at, size))
+            continue
+
+        layer = _child(node, "layer")
+        layer = layer[1] if layer else ""
+        if layer not in PREVIEW_LAYERS:
+            continue
+        if kind in ("fp_line", "fp_rect"):
+            start, end = _xy(node, "start"), _xy(node, "end")
+            if start and end:
+                shapes.append(("line" if kind == "fp_line" else "rect", layer, start, end))
+        elif kind == "fp_circle":
+            center, end = _xy(node, "center"), _xy(node, "end")
+            if center and end:
+                shapes.append(("circle", layer, center, end))
+        elif kind == "fp_poly":
+            pts = _child(node, "pts")
+            if pts:
+                points = [(float(p[1]), float(p[2])) for p in pts[1:] if isinstance(p, list) and p[0] == "xy"]
+                shapes.append(("poly", layer, points))
+    return shapes
+
+def shapes_bounds(shapes):
+    xs, ys = [], []
+    for shape in shapes:
+        if shape[0] == "pad":
+            (x, y), (w, h) = shape[2], shape[3]
+            xs += [x - w / 2, x + w / 2]
+            ys += [y - h / 2, y + h / 2]
+        elif shape[0] == "poly":
+            xs += [p[0] for p in shape[2]]
+            ys += [p[1] for p in shape[2]]
+        elif shape[0] == "circle":
+            (cx, cy), (ex, ey) = shape[2], shape[3]
+            r = ((ex - cx) ** 2 + (ey - cy) ** 2) ** 0.5
+            xs += [cx - r, cx + r]
+            ys += [cy - r, cy + r]
+        else:
+            xs += [shape[2][0], shape[3][0]]
+            ys += [shape[2][1], shape[3][1]]
+    if not xs:
+        return None
+    return min(xs), min(ys), max(xs), max(ys)
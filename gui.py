@@ -1,17 +1,35 @@
 import wx
 import json
+import threading
+from .footprint_preview import footprint_shapes, shapes_bounds
+from .speculative import SpeculativeRenderer, record_processor
+from .rate_limiter import get_rate_limiter
+from .perf_log import span
+
+# Returned by DigikeyDialog.ShowModal when the user asks for a catalog refresh
+ID_REFRESH_CATALOG = wx.NewIdRef()
+
+# Rows processed and rendered ahead of time, the rest are done when they are selected
+SPECULATIVE_ROWS = 50
 
 class ProgressCounterDialog(wx.Dialog):
-    def __init__(self, parent, title, message):
+    def __init__(self, parent, title, message, on_cancel=None, control=None):
         wx.Dialog.__init__(self, parent, title=title, style=wx.DEFAULT_DIALOG_STYLE)
         sizer = wx.BoxSizer(wx.VERTICAL)
         self.count = 0
+        # The worker's perf_log spans report what it is doing on its SearchControl
+        self.control = control
         
         self.message_label = wx.StaticText(self, label=message)
         self.counter_label = wx.StaticText(self, label="0 seconds")
+        self.counter_label.SetMinSize((260, -1))
         
         sizer.Add(self.message_label, 0, wx.ALL | wx.EXPAND, 15)
         sizer.Add(self.counter_label, 0, wx.ALL | wx.ALIGN_CENTER_HORIZONTAL, 15)
+        if on_cancel is not None:
+            btn_cancel = wx.Button(self, wx.ID_CANCEL, label="Cancel")
+            btn_cancel.Bind(wx.EVT_BUTTON, lambda e: on_cancel())
+            sizer.Add(btn_cancel, 0, wx.ALL | wx.ALIGN_CENTER_HORIZONTAL, 10)
         
         self.SetSizerAndFit(sizer)
         self.CenterOnParent()
@@ -22,7 +40,11 @@ class ProgressCounterDialog(wx.Dialog):
 
     def on_timer(self, event):
         self.count += 1
-        self.counter_label.SetLabel(f"{self.count} seconds")
+        phase = self.control.phase if self.control is not None else None
+        if phase:
+            self.counter_label.SetLabel(f"{phase}... {self.count} s")
+        else:
+            self.counter_label.SetLabel(f"{self.count} seconds")
 
 class DigikeyDialog(wx.Dialog):
     def create_cap_controls(self, parent, key, state, show_type=True, custom_vol_opts=None):
@@ -217,6 +239,28 @@ class DigikeyDialog(wx.Dialog):
         # Restore Main tab selection
         self.notebook.SetSelection(state.get('main_tab', 0))
 
+        # Search options
+        row_opts = wx.BoxSizer(wx.HORIZONTAL)
+        self.bypass_cache = wx.CheckBox(self, label="Bypass search cache")
+        self.bypass_cache.SetValue(state.get('bypass_cache', False))
+        row_opts.Add(self.bypass_cache, 0, wx.ALIGN_CENTER_VERTICAL | wx.ALL, 5)
+        self.fan_out = wx.CheckBox(self, label="Search all variants")
+        self.fan_out.SetToolTip("Resistors: every tolerance. Capacitors: every capacitor type and package. Results are merged by price.")
+        self.fan_out.SetValue(state.get('fan_out', False))
+        row_opts.Add(self.fan_out, 0, wx.ALIGN_CENTER_VERTICAL | wx.ALL, 5)
+        self.offline = wx.CheckBox(self, label="Use offline catalog")
+        self.offline.SetValue(state.get('offline', False))
+        row_opts.Add(self.offline, 0, wx.ALIGN_CENTER_VERTICAL | wx.ALL, 5)
+        btn_refresh = wx.Button(self, ID_REFRESH_CATALOG, label="Refresh catalog")
+        btn_refresh.Bind(wx.EVT_BUTTON, lambda e: self.EndModal(ID_REFRESH_CATALOG))
+        row_opts.Add(btn_refresh, 0, wx.ALIGN_CENTER_VERTICAL | wx.ALL, 5)
+        lbl_max = wx.StaticText(self, label="Max results:")
+        self.max_results = wx.SpinCtrl(self, min=50, max=2000, initial=state.get('max_results', 200))
+        self.max_results.SetIncrement(50)
+        row_opts.Add(lbl_max, 0, wx.ALIGN_CENTER_VERTICAL | wx.ALL, 5)
+        row_opts.Add(self.max_results, 0, wx.ALIGN_CENTER_VERTICAL | wx.ALL, 5)
+        sizer.Add(row_opts, 0, wx.EXPAND | wx.ALL, 5)
+
         # Buttons
         btns = self.CreateButtonSizer(wx.OK | wx.CANCEL)
         sizer.Add(btns, 0, wx.EXPAND | wx.ALL, 5)
@@ -293,33 +337,224 @@ class CredentialsDialog(wx.Dialog):
     def get_credentials(self):
         return self.txt_id.GetValue(), self.txt_secret.GetValue()
 
+class ResultListCtrl(wx.ListCtrl):
+    """
+    Virtual list over a column store of the search results.
+    Rows are only formatted when wx asks for them, sorting and filtering just rebuild the view index.
+    """
+    COLUMNS = [("Part Number", 150), ("Price", 80), ("Stock", 80), ("Description", 350)]
+    SORTABLE = {0: 'mpn', 1: 'price', 2: 'stock'}
+
+    def __init__(self, parent):
+        wx.ListCtrl.__init__(self, parent, style=wx.LC_REPORT | wx.LC_VIRTUAL | wx.LC_SINGLE_SEL | wx.BORDER_SUNKEN)
+        for i, (name, width) in enumerate(self.COLUMNS):
+            self.InsertColumn(i, name, width=width)
+
+        self.store = {'mpn': [], 'price': [], 'stock': [], 'desc': [], 'search': []}
+        self.view = []
+        self.sort_col = None
+        self.sort_ascending = True
+        self.filter_text = ""
+
+        self.Bind(wx.EVT_LIST_COL_CLICK, self.on_col_click)
+
+    def append(self, products):
+        for product in products:
+            mpn = product.mpn
+            desc = product.description
+            if product.variant is not None:
+                desc = f"[{product.variant}] {desc}"
+            self.store['mpn'].append(mpn)
+            self.store['price'].append(product.price)
+            self.store['stock'].append(product.stock)
+            self.store['desc'].append(desc)
+            self.store['search'].append(f"{mpn} {desc}".lower())
+        self.refresh_view()
+
+    def selected_product_index(self):
+        row = self.GetFirstSelected()
+        if row == -1:
+            return -1
+        return self.view[row]
+
+    def set_filter(self, text):
+        self.filter_text = text.strip().lower()
+        self.refresh_view()
+
+    def on_col_click(self, event):
+        col = event.GetColumn()
+        if col not in self.SORTABLE:
+            return
+        if self.sort_col == col:
+            self.sort_ascending = not self.sort_ascending
+        else:
+            self.sort_col = col
+            self.sort_ascending = True
+        self.refresh_view()
+
+    def refresh_view(self):
+        old_row = self.GetFirstSelected()
+        selected = self.view[old_row] if old_row != -1 else -1
+        if old_row != -1:
+            self.Select(old_row, on=0)
+
+        rows = range(len(self.store['mpn']))
+        if self.filter_text:
+            terms = self.filter_text.split()
+            search = self.store['search']
+            rows = [i for i in rows if all(t in search[i] for t in terms)]
+        rows = list(rows)
+
+        if self.sort_col is not None:
+            values = self.store[self.SORTABLE[self.sort_col]]
+            # Missing prices/stock always sink to the bottom
+            missing = [i for i in rows if values[i] is None]
+            present = [i for i in rows if values[i] is not None]
+            present.sort(key=values.__getitem__, reverse=not self.sort_ascending)
+            rows = present + missing
+        self.view = rows
+
+        self.SetItemCount(len(self.view))
+        if selected != -1 and selected in self.view:
+            row = self.view.index(selected)
+            self.Select(row)
+            self.EnsureVisible(row)
+        self.Refresh()
+
+    def OnGetItemText(self, item, col):
+        idx = self.view[item]
+        if col == 0:
+            return self.store['mpn'][idx]
+        if col == 1:
+            price = self.store['price'][idx]
+            return "N/A" if price is None else str(price)
+        if col == 2:
+            stock = self.store['stock'][idx]
+            return "N/A" if stock is None else str(stock)
+        return self.store['desc'][idx]
+
+class FootprintPreview(wx.Panel):
+    """
+    Draws the shapes from footprint_preview.footprint_shapes, scaled to fit.
+    """
+    COLOURS = {"F.SilkS": wx.Colour(242, 237, 161), "F.Fab": wx.Colour(175, 175, 175), "F.CrtYd": wx.Colour(255, 38, 226)}
+    PAD_COLOUR = wx.Colour(200, 160, 60)
+
+    def __init__(self, parent, size=(260, 220)):
+        wx.Panel.__init__(self, parent, size=size, style=wx.BORDER_SUNKEN)
+        self.SetBackgroundStyle(wx.BG_STYLE_PAINT)
+        self.shapes = []
+        self.bounds = None
+        self.message = "Select a part to preview its footprint"
+        self.Bind(wx.EVT_PAINT, self.on_paint)
+        self.Bind(wx.EVT_SIZE, lambda e: self.Refresh())
+
+    def set_shapes(self, shapes, bounds):
+        self.shapes = shapes
+        self.bounds = bounds
+        self.message = "" if bounds else "Nothing to preview"
+        self.Refresh()
+
+    def set_message(self, message):
+        self.shapes = []
+        self.bounds = None
+        self.message = message
+        self.Refresh()
+
+    def on_paint(self, event):
+        dc = wx.AutoBufferedPaintDC(self)
+        dc.SetBackground(wx.Brush(wx.Colour(0, 16, 35)))
+        dc.Clear()
+        w, h = self.GetClientSize()
+        if not self.bounds:
+            dc.SetTextForeground(wx.Colour(200, 200, 200))
+            tw, th = dc.GetTextExtent(self.message)
+            dc.DrawText(self.message, max(0, (w - tw) // 2), (h - th) // 2)
+            return
+
+        x0, y0, x1, y1 = self.bounds
+        margin = 10
+        scale = min((w - 2 * margin) / max(x1 - x0, 0.1), (h - 2 * margin) / max(y1 - y0, 0.1))
+        ox = margin + ((w - 2 * margin) - (x1 - x0) * scale) / 2 - x0 * scale
+        oy = margin + ((h - 2 * margin) - (y1 - y0) * scale) / 2 - y0 * scale
+        pt = lambda p: wx.Point(int(ox + p[0] * scale), int(oy + p[1] * scale))
+
+        for shape in self.shapes:
+            kind = shape[0]
+            if kind == "pad":
+                (x, y), (pw, ph) = shape[2], shape[3]
+                dc.SetPen(wx.Pen(self.PAD_COLOUR))
+                dc.SetBrush(wx.Brush(self.PAD_COLOUR))
+                if shape[1] == "circle":
+                    dc.DrawCircle(pt((x, y)), int(pw * scale / 2))
+                else:
+                    dc.DrawRectangle(pt((x - pw / 2, y - ph / 2)), wx.Size(int(pw * scale), int(ph * scale)))
+                continue
+
+            colour = self.COLOURS.get(shape[1], wx.WHITE)
+            dc.SetPen(wx.Pen(colour))
+            dc.SetBrush(wx.TRANSPARENT_BRUSH)
+            if kind == "line":
+                dc.DrawLine(pt(shape[2]), pt(shape[3]))
+            elif kind == "rect":
+                (ax, ay), (bx, by) = shape[2], shape[3]
+                dc.DrawPolygon([pt((ax, ay)), pt((bx, ay)), pt((bx, by)), pt((ax, by))])
+            elif kind == "circle":
+                (cx, cy), (ex, ey) = shape[2], shape[3]
+                r = ((ex - cx) ** 2 + (ey - cy) ** 2) ** 0.5
+                dc.DrawCircle(pt((cx, cy)), int(r * scale))
+            elif kind == "poly":
+                dc.SetBrush(wx.Brush(colour))
+                dc.DrawPolygon([pt(p) for p in shape[2]])
+
 class ResultDialog(wx.Dialog):
-    def __init__(self, parent, results, processor, generator_callback):
-        wx.Dialog.__init__(self, parent, title="Search Results", size=(700, 400), style=wx.DEFAULT_DIALOG_STYLE | wx.RESIZE_BORDER)
-        self.processor = processor
+    def __init__(self, parent, results, processor, generator_callback, more_pages=None, renderer=None):
+        wx.Dialog.__init__(self, parent, title="Search Results", size=(980, 440), style=wx.DEFAULT_DIALOG_STYLE | wx.RESIZE_BORDER)
+        # Rows are ProductRecords, the full JSON is only loaded for the rows that get processed
+        self.processor = record_processor(processor)
         self.generator_callback = generator_callback
+        # Process and render the first rows in the background as soon as they are listed
+        self.speculative = None
+        if renderer is not None:
+            self.speculative = SpeculativeRenderer(self.processor, renderer, lambda idx: wx.CallAfter(self._on_rendered, idx))
+        self.total_count = results.get("ProductsCount", 0)
+        self.catalog_note = self._catalog_note(results)
+        if results.get("Stale"):
+            self.catalog_note = "cached results, DigiKey did not answer in time"
+        self.budget_note = "" if results.get("Offline") else get_rate_limiter().summary()
+        self.more_pages = more_pages
+        self.loading = more_pages is not None
+        self.closing = threading.Event()
 
         sizer = wx.BoxSizer(wx.VERTICAL)
 
-        self.list_ctrl = wx.ListCtrl(self, style=wx.LC_REPORT | wx.BORDER_SUNKEN)
-        self.list_ctrl.InsertColumn(0, "Part Number", width=150)
-        self.list_ctrl.InsertColumn(1, "Price", width=80)
-        self.list_ctrl.InsertColumn(2, "Stock", width=80)
-        self.list_ctrl.InsertColumn(3, "Description", width=350)
+        # Filter runs on the rows already loaded, no new search
+        self.filter_ctrl = wx.SearchCtrl(self)
+        self.filter_ctrl.SetDescriptiveText("Filter by part number or description")
+        self.filter_ctrl.ShowCancelButton(True)
+        sizer.Add(self.filter_ctrl, 0, wx.EXPAND | wx.ALL, 5)
+
+        body = wx.BoxSizer(wx.HORIZONTAL)
+        self.list_ctrl = ResultListCtrl(self)
+        body.Add(self.list_ctrl, 1, wx.EXPAND | wx.ALL, 5)
+
+        preview_sizer = wx.BoxSizer(wx.VERTICAL)
+        self.preview = FootprintPreview(self)
+        self.preview_label = wx.StaticText(self, label="")
+        preview_sizer.Add(self.preview, 1, wx.EXPAND | wx.ALL, 5)
+        preview_sizer.Add(self.preview_label, 0, wx.EXPAND | wx.ALL, 5)
+        body.Add(preview_sizer, 0, wx.EXPAND)
+        if self.speculative is None:
+            body.Hide(preview_sizer)
 
-        self.products = results.get("Products", [])
-        for product in self.products:
-            mpn = product.get("ManufacturerProductNumber", "N/A")
-            price = str(product.get("UnitPrice", "N/A"))
-            stock = str(product.get("QuantityAvailable", "N/A"))
-            desc = product.get("Description", {}).get("DetailedDescription", "N/A")
+        self.products = []
+        self.add_products(results.get("Products", []))
 
-            index = self.list_ctrl.InsertItem(self.list_ctrl.GetItemCount(), mpn)
-            self.list_ctrl.SetItem(index, 1, price)
-            self.list_ctrl.SetItem(index, 2, stock)
-            self.list_ctrl.SetItem(index, 3, desc)
+        sizer.Add(body, 1, wx.EXPAND)
 
-        sizer.Add(self.list_ctrl, 1, wx.EXPAND | wx.ALL, 5)
+        self.status_label = wx.StaticText(self, label="")
+        sizer.Add(self.status_label, 0, wx.LEFT | wx.RIGHT, 10)
+        self.update_status()
 
         btns = self.CreateButtonSizer(wx.OK | wx.CANCEL)
         sizer.Add(btns, 0, wx.EXPAND | wx.ALL, 5)
@@ -328,21 +563,144 @@ class ResultDialog(wx.Dialog):
         self.CenterOnParent()
         
         self.Bind(wx.EVT_BUTTON, self.on_ok, id=wx.ID_OK)
+        self.Bind(wx.EVT_WINDOW_DESTROY, self.on_destroy)
+        self.filter_ctrl.Bind(wx.EVT_TEXT, self.on_filter)
+        self.filter_ctrl.Bind(wx.EVT_SEARCHCTRL_CANCEL_BTN, self.on_filter_cancel)
+        self.list_ctrl.Bind(wx.EVT_LIST_ITEM_SELECTED, self.on_select)
+
+        # Remaining pages stream in on a background thread
+        if more_pages is not None:
+            threading.Thread(target=self._load_pages, daemon=True).start()
+
+    def add_products(self, products):
+        start = len(self.products)
+        self.products.extend(products)
+        self.list_ctrl.append(products)
+        if self.speculative is not None and start < SPECULATIVE_ROWS:
+            self.speculative.submit(enumerate(products[:SPECULATIVE_ROWS - start], start))
+
+    def on_select(self, event):
+        event.Skip()
+        if self.speculative is None:
+            return
+        idx = self.list_ctrl.selected_product_index()
+        if idx == -1:
+            return
+        if self.speculative.get(idx) is None:
+            self.preview.set_message("Rendering...")
+            self.preview_label.SetLabel("")
+            self.speculative.prioritize(idx, self.products[idx])
+        else:
+            self.show_preview(idx)
+
+    def _on_rendered(self, idx):
+        if not self or self.closing.is_set():
+            return
+        if self.list_ctrl.selected_product_index() == idx:
+            self.show_preview(idx)
+
+    def show_preview(self, idx):
+        processed_data, rendered, error = self.speculative.get(idx)
+        if error is not None:
+            self.preview.set_message("Could not render this part")
+            self.preview_label.SetLabel(str(error))
+            return
+        shapes = footprint_shapes(rendered["footprint"])
+        self.preview.set_shapes(shapes, shapes_bounds(shapes))
+        fp_name = processed_data.get("footprint_name", "").replace(".kicad_mod", "")
+        self.preview_label.SetLabel(f"{fp_name}\n{processed_data['Symbol Data'].get('symbol', '')}")
+        self.preview_label.Wrap(self.preview.GetSize().width)
+
+    def _catalog_note(self, results):
+        if not results.get("Offline"):
+            return ""
+        age = results.get("CatalogAge")
+        if age is None:
+            note = "offline catalog, never synced"
+        elif age < 3600:
+            note = f"offline catalog, synced {int(age / 60)} min ago"
+        elif age < 2 * 86400:
+            note = f"offline catalog, synced {int(age / 3600)} h ago"
+        else:
+            note = f"offline catalog, synced {int(age / 86400)} days ago"
+        if results.get("CatalogStale"):
+            note += " (stale, use Refresh catalog)"
+        return note
+
+    def update_status(self):
+        label = f"Showing {len(self.list_ctrl.view)} of {len(self.products)} loaded, {self.total_count} found"
+        if self.catalog_note:
+            label += f" - {self.catalog_note}"
+        if self.budget_note:
+            label += f" - {self.budget_note}"
+        if self.loading:
+            label += " (loading more...)"
+        self.status_label.SetLabel(label)
+
+    def on_filter(self, event):
+        self.list_ctrl.set_filter(self.filter_ctrl.GetValue())
+        self.update_status()
+
+    def on_filter_cancel(self, event):
+        self.filter_ctrl.SetValue("")
+
+    def _load_pages(self):
+        try:
+            for products in self.more_pages:
+                if self.closing.is_set():
+                    break
+                wx.CallAfter(self._on_page, products)
+        finally:
+            self.more_pages.close()
+            wx.CallAfter(self._on_pages_done)
+
+    def _on_page(self, products):
+        if not self or self.closing.is_set():
+            return
+        self.add_products(products)
+        self.update_status()
+
+    def _on_pages_done(self):
+        if not self or self.closing.is_set():
+            return
+        self.loading = False
+        self.update_status()
+
+    def on_destroy(self, event):
+        if event.GetEventObject() is self:
+            self.closing.set()
+            if self.speculative is not None:
+                self.speculative.stop()
+        event.Skip()
 
     def on_ok(self, event):
-        selected_idx = self.list_ctrl.GetFirstSelected()
+        selected_idx = self.list_ctrl.selected_product_index()
         if selected_idx == -1:
             wx.MessageBox("Please select a component.", "Info", wx.OK | wx.ICON_INFORMATION)
             return
 
         product = self.products[selected_idx]
-        processed_data = self.processor(product)
+        entry = self.speculative.get(selected_idx) if self.speculative is not None else None
+        if entry is not None and entry[2] is None:
+            processed_data, rendered = entry[0], entry[1]
+        else:
+            try:
+                processed_data, rendered = self.processor(product), None
+            except Exception as e:
+                # Rows not processed ahead load their product JSON here, from the cache or DigiKey
+                wx.MessageBox(str(e), "Generation Status", wx.OK | wx.ICON_ERROR)
+                return
         # dlg = JsonViewDialog(self, processed_data, self.generator_callback)
         # dlg.SetTitle("Processed Data")
         # dlg.ShowModal()
         # dlg.Destroy()
         
-        success, msg = self.generator_callback(processed_data)
+        with span("generate", prerendered=rendered is not None) as s:
+            if rendered is not None:
+                success, msg = self.generator_callback(processed_data, rendered)
+            else:
+                success, msg = self.generator_callback(processed_data)
+            s.set(success=success)
         icon = wx.ICON_INFORMATION if success else wx.ICON_ERROR
         wx.MessageBox(msg, "Generation Status", wx.OK | icon)
         
@@ -0,0 +1,413 @@
+import os
+import wx
+import json
+import threading
+import wx.lib.delayedresult as delayedresult
+from .gui import DigikeyDialog, ProgressCounterDialog, ResultDialog, CredentialsDialog, ID_REFRESH_CATALOG
+from .TH_Resistors import process_resistor, search_tht_resistor
+from .TH_Radial_ElectrolyticCapacitors import process_capacitor, search_tht_capacitor
+from .TH_Disc_Capacitors import search_tht_disc_capacitor, process_disc_capacitor
+from .digikey_client import iter_search_pages
+from .token_manager import TokenManager
+from .catalog_store import get_catalog_store, sync_catalog
+from .prefetch import start_prefetch, make_search, note_activity
+from .fan_out import fan_out_search, VARIANT_KEY
+from .product_records import with_source
+from .cancellation import SearchControl, activate
+from .perf_log import span
+from .library_generator import generate_library_files, render_part, find_similar_footprint, use_footprint, CAPACITOR_CONFIGS
+
+PLUGIN_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MAX_RESULTS = 200
+# Seconds before a search gives up and shows whatever it has (stale cache, finished fan out variants)
+SEARCH_DEADLINE = 30
+
+# Fan out variants: every tolerance search_tht_resistor maps, and every capacitor tab and package
+FAN_OUT_TOLERANCES = [(0, "0.1%"), (1, "1%"), (2, "2%"), (3, "5%")]
+FAN_OUT_CAPACITORS = [("Aluminum Axial", 'alum', 0), ("Aluminum Radial", 'alum', 1), ("Disc", 'film', 0),
+                      ("Mica Axial", 'mica', 0), ("Mica Radial", 'mica', 1)]
+
+class DigikeyImporter:
+    """
+    Everything behind the toolbar button. Lives in its own module so KiCad only pays for
+    requests, jinja2, the generators and the dialogs when the plugin is first used.
+    """
+    def __init__(self):
+        # Initialize state with defaults (Index 0 for both)
+        self.state = {'pwr_idx': 0, 'tol_idx': 0, 'film_vol_idx': 6, 'bypass_cache': False, 'max_results': DEFAULT_MAX_RESULTS, 'offline': False, 'fan_out': False}
+        self.client_id = None
+        self.client_secret = None
+        self.progress_dialog = None
+        self.token_manager = None
+        # The prefetch thread and the search workers ask for tokens at the same time, they must share one manager
+        self.token_lock = threading.Lock()
+
+    def run(self):
+        """
+        Show the importer dialog and start the search, called from DigikeyPlugin.Run.
+        """
+        note_activity()
+        if not self._ensure_credentials():
+            return  # User cancelled or failed to provide credentials
+        self.start_prefetch()
+
+        pcbnew_window = wx.FindWindowByName("PcbFrame")
+        dlg = DigikeyDialog(pcbnew_window, self.state)
+        result = dlg.ShowModal()
+        if result == ID_REFRESH_CATALOG:
+            self._start_catalog_refresh(pcbnew_window)
+        elif result == wx.ID_OK:
+            # Save Tab States
+            self.state['main_tab'] = dlg.notebook.GetSelection()
+            self.state['tht_tab'] = dlg.tht_notebook.GetSelection()
+            self.state['cap_tab'] = dlg.tht_cap_notebook.GetSelection()
+            self.state['bypass_cache'] = dlg.bypass_cache.GetValue()
+            self.state['max_results'] = dlg.max_results.GetValue()
+            self.state['offline'] = dlg.offline.GetValue()
+            self.state['fan_out'] = dlg.fan_out.GetValue()
+
+            # Save the state of Power Rating
+            for i, rb in enumerate(dlg.tht_res_pwr_radios):
+                if rb.GetValue():
+                    self.state['pwr_idx'] = i
+            
+            # Save the state of Tolerance
+            for i, rb in enumerate(dlg.tht_res_tol_radios):
+                if rb.GetValue():
+                    self.state['tol_idx'] = i
+            
+            # Save Capacitor States
+            for key, controls in dlg.cap_tabs.items():
+                for i, rb in enumerate(controls['type']):
+                    if rb.GetValue(): self.state[f'{key}_type_idx'] = i
+                for i, rb in enumerate(controls['vol']):
+                    if rb.GetValue(): self.state[f'{key}_vol_idx'] = i
+            
+            # Trigger Search
+            # Check which tab is active
+            if dlg.notebook.GetSelection() == 0: # Through Hole
+                if dlg.tht_notebook.GetSelection() == 0: # Resistors
+                    res_val = dlg.tht_res_val.GetValue()
+                    if res_val and self.state['fan_out']:
+                        control = self._start_progress(pcbnew_window, "Searching every tolerance...")
+                        variants, sources, processors = [], {}, {}
+                        for tol_idx, label in FAN_OUT_TOLERANCES:
+                            first_page, sources[label] = self._raw_pages(self._api_worker_resistor, [res_val, self.state['pwr_idx'], tol_idx], control)
+                            variants.append((label, first_page))
+                            processors[label] = process_resistor
+                        delayedresult.startWorker(self._on_api_result_fan_out, fan_out_search, wargs=[variants, sources, control],
+                                                  cargs=[processors], ckwargs={'control': control})
+                    elif res_val:
+                        control = self._start_progress(pcbnew_window, "Searching for resistors...")
+                        search_page = self._compact_pages(self._api_worker_resistor, [res_val, self.state['pwr_idx'], self.state['tol_idx']])
+                        delayedresult.startWorker(self._on_api_result_resistor, search_page, 
+                                                  wargs=[0], wkwargs={'control': control}, cargs=[search_page], ckwargs={'control': control})
+
+                elif dlg.tht_notebook.GetSelection() == 1: # Capacitors
+                    sel = dlg.tht_cap_notebook.GetSelection()
+                    tab_keys = ['alum', 'film', 'mica']
+                    if sel < len(tab_keys):
+                        key = tab_keys[sel]
+                        controls = dlg.cap_tabs[key]
+                        
+                        cap_val = controls['val'].GetValue()
+                        if cap_val:
+                            cap_val = cap_val.replace("u", "µ")
+                            vol_idx = self.state.get(f'{key}_vol_idx', 0)
+                            vol_str = controls['vol_opts'][vol_idx]
+                            cust_vol = controls['cust_vol'].GetValue()
+                            if cust_vol: vol_str = cust_vol
+                            
+                            type_idx = self.state.get(f'{key}_type_idx', 0)
+                            
+                            cat_id, lib_config = CAPACITOR_CONFIGS.get(key, ('58', {}))
+
+                            if self.state['fan_out']:
+                                control = self._start_progress(pcbnew_window, "Searching every capacitor type...")
+                                variants, sources, processors = [], {}, {}
+                                for label, tab_key, t_idx in FAN_OUT_CAPACITORS:
+                                    v_cat, v_config = CAPACITOR_CONFIGS[tab_key]
+                                    first_page, sources[label] = self._raw_pages(self._api_worker_capacitor, [cap_val, vol_str, t_idx, v_cat], control)
+                                    variants.append((label, first_page))
+                                    processors[label] = self._capacitor_processor(v_config)
+                                delayedresult.startWorker(self._on_api_result_fan_out, fan_out_search, wargs=[variants, sources, control],
+                                                          cargs=[processors], ckwargs={'control': control})
+                            else:
+                                control = self._start_progress(pcbnew_window, "Searching for capacitors...")
+                                search_page = self._compact_pages(self._api_worker_capacitor, [cap_val, vol_str, type_idx, cat_id])
+                                delayedresult.startWorker(self._on_api_result_capacitor, search_page, 
+                                                          wargs=[0], wkwargs={'control': control}, cargs=[lib_config, search_page], ckwargs={'control': control})
+
+        dlg.Destroy()
+
+    def _ensure_credentials(self):
+        # If already loaded, do nothing.
+        if self.client_id and self.client_secret:
+            return True
+
+        if self._load_saved_credentials():
+            return True
+
+        config_path = os.path.join(PLUGIN_DIR, "config.json")
+        # If we are here, no credentials found. Prompt user.
+        client_id, client_secret = self._prompt_for_credentials()
+
+        if client_id and client_secret:
+            self.client_id = client_id
+            self.client_secret = client_secret
+            
+            # Save to config.json
+            config = {}
+            if os.path.exists(config_path):
+                try:
+                    with open(config_path, 'r') as f:
+                        config = json.load(f)
+                except Exception:
+                    pass
+            config["DIGIKEY_CLIENT_ID"] = client_id
+            config["DIGIKEY_CLIENT_SECRET"] = client_secret
+            try:
+                with open(config_path, 'w') as f:
+                    json.dump(config, f, indent=4)
+            except Exception as e:
+                parent = wx.FindWindowByName("PcbFrame")
+                wx.MessageBox(f"Could not save credentials to config.json:\n{e}", "Error", wx.OK | wx.ICON_ERROR, parent=parent)
+            
+            return True # We have the credentials for this session anyway
+        
+        parent = wx.FindWindowByName("PcbFrame")
+        if client_id is not None or client_secret is not None: # i.e. user didn't cancel both
+            wx.MessageBox("Client ID and Secret are required to use the Digikey API.", "Credentials Required", wx.OK | wx.ICON_WARNING, parent=parent)
+        return False
+
+    def _load_saved_credentials(self):
+        """
+        Credentials from the environment or config.json, without asking the user.
+        """
+        # Try environment variables
+        self.client_id = os.environ.get("DIGIKEY_CLIENT_ID")
+        self.client_secret = os.environ.get("DIGIKEY_CLIENT_SECRET")
+        if self.client_id and self.client_secret:
+            return True
+
+        # Fallback: Try to load from config.json
+        config_path = os.path.join(PLUGIN_DIR, "config.json")
+        if os.path.exists(config_path):
+            try:
+                with open(config_path, 'r') as f:
+                    config = json.load(f)
+                    self.client_id = config.get("DIGIKEY_CLIENT_ID")
+                    self.client_secret = config.get("DIGIKEY_CLIENT_SECRET")
+                if self.client_id and self.client_secret:
+                    return True
+            except Exception:
+                # Corrupt json or other issue, we'll proceed to ask the user
+                pass
+        return False
+
+    def start_prefetch(self):
+        """
+        Warm the search cache in the background when prefetch is enabled (see prefetch.py).
+        Never prompts, without saved credentials this waits for the first run.
+        """
+        if not (self.client_id and self.client_secret) and not self._load_saved_credentials():
+            return None
+        return start_prefetch(make_search(self.get_token, self.client_id))
+
+    def _prompt_for_credentials(self):
+        parent = wx.FindWindowByName("PcbFrame")
+        with CredentialsDialog(parent) as dlg:
+            if dlg.ShowModal() == wx.ID_OK:
+                return dlg.get_credentials()
+        return None, None
+
+    def _start_progress(self, parent, message):
+        """
+        Show the progress dialog for a new search and return the SearchControl its Cancel button and deadline drive.
+        """
+        control = SearchControl(SEARCH_DEADLINE)
+        self.progress_dialog = ProgressCounterDialog(parent, "API Call", message, on_cancel=lambda: self._cancel_search(control),
+                                                     control=control)
+        self.progress_dialog.Show()
+        return control
+
+    def _cancel_search(self, control):
+        # The worker winds down on its own, its result callback sees the cancel and shows nothing
+        control.cancel()
+        self._close_progress()
+
+    def _close_progress(self):
+        if self.progress_dialog:
+            self.progress_dialog.Destroy()
+            self.progress_dialog = None
+
+    def _raw_pages(self, worker, args, control=None):
+        """
+        (first_page, raw_page) for one search. first_page() honours Bypass cache, raw_page(offset) is what
+        ProductRecord.raw() reloads from and always reads the cache the first search just filled.
+        """
+        bypass_cache, offline = self.state['bypass_cache'], self.state['offline']
+        first_page = lambda: worker(*args, bypass_cache=bypass_cache, offline=offline, control=control)
+        raw_page = lambda offset=0: worker(*args, offline=offline, offset=offset)
+        return first_page, raw_page
+
+    def _compact_pages(self, worker, args):
+        """
+        search_page(offset) for the result dialog, returning ProductRecords that load their JSON from the cache.
+        Only the first page is run under the search's control, later pages load while the dialog is open.
+        """
+        bypass_cache, offline = self.state['bypass_cache'], self.state['offline']
+        raw_page = lambda offset=0: worker(*args, offline=offline, offset=offset)
+        return lambda offset=0, control=None: with_source(worker(*args, bypass_cache=bypass_cache, offline=offline, offset=offset, compact=True, control=control),
+                                                          raw_page, offset)
+
+    def _api_worker_resistor(self, res_val, pwr_idx, tol_idx, bypass_cache=False, offline=False, offset=0, compact=False, control=None):
+        note_activity()
+        with activate(control), span("search_resistor", value=res_val, offset=offset, offline=offline):
+            # The token is only fetched on a cache miss, the offline catalog never needs one
+            with span("search", phase="Searching for resistors"):
+                return search_tht_resistor(res_val, pwr_idx, tol_idx, self.get_token, self.client_id, lambda: self.get_token(force_refresh=True), bypass_cache=bypass_cache, offset=offset, offline=offline, compact=compact)
+
+    def _on_api_result_resistor(self, delayedResult, search_page=None, control=None):
+        if control is not None and control.cancelled:
+            return
+        self._close_progress()
+
+        try:
+            results = delayedResult.get()
+            if results and results.get("ProductsCount", 0) > 0:
+                pcbnew_window = wx.FindWindowByName("PcbFrame")
+                res_dlg = ResultDialog(pcbnew_window, results, processor=process_resistor, generator_callback=self._generate, renderer=render_part,
+                                       more_pages=self._more_pages(results, search_page))
+                res_dlg.ShowModal()
+                res_dlg.Destroy()
+            elif results is None:
+                wx.MessageBox("API call failed. This could be due to an authentication issue.", "API Error", wx.OK | wx.ICON_ERROR)
+            else: # results is not None but no products
+                wx.MessageBox("No results found for the specified criteria.", "Info", wx.OK | wx.ICON_INFORMATION)
+        except Exception as e:
+            wx.MessageBox(f"API Error: {e}", "Error", wx.OK | wx.ICON_ERROR)
+
+    def _api_worker_capacitor(self, cap_val, vol_str, type_idx, cat_id, bypass_cache=False, offline=False, offset=0, compact=False, control=None):
+        note_activity()
+        with activate(control), span("search_capacitor", value=cap_val, category=cat_id, offset=offset, offline=offline):
+            with span("search", phase="Searching for capacitors"):
+                if cat_id == '60':
+                    return search_tht_disc_capacitor(cap_val, vol_str, cat_id, self.get_token, self.client_id, lambda: self.get_token(force_refresh=True), bypass_cache=bypass_cache, offset=offset, offline=offline, compact=compact)
+                return search_tht_capacitor(cap_val, vol_str, type_idx, cat_id, self.get_token, self.client_id, lambda: self.get_token(force_refresh=True), bypass_cache=bypass_cache, offset=offset, offline=offline, compact=compact)
+
+    def _on_api_result_capacitor(self, delayedResult, lib_config=None, search_page=None, control=None):
+        if control is not None and control.cancelled:
+            return
+        self._close_progress()
+
+        try:
+            results = delayedResult.get()
+            if results and results.get("ProductsCount", 0) > 0:
+                pcbnew_window = wx.FindWindowByName("PcbFrame")
+                
+                processor = self._capacitor_processor(lib_config)
+                res_dlg = ResultDialog(pcbnew_window, results, processor=processor, generator_callback=self._generate, renderer=render_part,
+                                       more_pages=self._more_pages(results, search_page))
+                res_dlg.ShowModal()
+                res_dlg.Destroy()
+            elif results is None:
+                wx.MessageBox("API call failed. This could be due to an authentication issue.", "API Error", wx.OK | wx.ICON_ERROR)
+            else: # results is not None but no products
+                wx.MessageBox("No results found for the specified criteria.", "Info", wx.OK | wx.ICON_INFORMATION)
+        except Exception as e:
+            wx.MessageBox(f"API Error: {e}", "Error", wx.OK | wx.ICON_ERROR)
+
+    def _capacitor_processor(self, lib_config):
+        proc_type = lib_config.get('proc', 'alum') if lib_config else 'alum'
+        if proc_type == 'disc':
+            return lambda p: process_disc_capacitor(p, lib_config)
+        return lambda p: process_capacitor(p, lib_config)
+
+    def _on_api_result_fan_out(self, delayedResult, processors, control=None):
+        if control is not None and control.cancelled:
+            return
+        self._close_progress()
+
+        try:
+            results = delayedResult.get()
+            if results and results.get("Products"):
+                pcbnew_window = wx.FindWindowByName("PcbFrame")
+                if results["FailedVariants"]:
+                    wx.MessageBox(f"These searches failed and are missing from the list: {', '.join(results['FailedVariants'])}",
+                                  "API Warning", wx.OK | wx.ICON_WARNING)
+                # Each merged product is processed the way its own search would have been
+                processor = lambda p: processors[p[VARIANT_KEY]](p)
+                res_dlg = ResultDialog(pcbnew_window, results, processor=processor, generator_callback=self._generate, renderer=render_part)
+                res_dlg.ShowModal()
+                res_dlg.Destroy()
+            elif results is None:
+                wx.MessageBox("API call failed. This could be due to an authentication issue.", "API Error", wx.OK | wx.ICON_ERROR)
+            else:
+                wx.MessageBox("No results found for the specified criteria.", "Info", wx.OK | wx.ICON_INFORMATION)
+        except Exception as e:
+            wx.MessageBox(f"API Error: {e}", "Error", wx.OK | wx.ICON_ERROR)
+
+    def _start_catalog_refresh(self, parent):
+        # No deadline and no Cancel button, the control only carries the phase to the dialog
+        control = SearchControl()
+        self.progress_dialog = ProgressCounterDialog(parent, "Catalog Refresh", "Refreshing the offline catalog from DigiKey...", control=control)
+        self.progress_dialog.Show()
+        delayedresult.startWorker(self._on_catalog_refreshed, self._catalog_worker, wargs=[control])
+
+    def _catalog_worker(self, control=None):
+        with activate(control):
+            token = self.get_token()
+            if not token:
+                return None
+            return sync_catalog(token, self.client_id, lambda: self.get_token(force_refresh=True))
+
+    def _on_catalog_refreshed(self, delayedResult):
+        if self.progress_dialog:
+            self.progress_dialog.Destroy()
+            self.progress_dialog = None
+
+        try:
+            stored = delayedResult.get()
+            if stored is None:
+                wx.MessageBox("Could not get a DigiKey token, the catalog was not refreshed.", "API Error", wx.OK | wx.ICON_ERROR)
+                return
+            store = get_catalog_store()
+            lines = []
+            for cat, count in stored.items():
+                state = store.sync_state(cat)
+                lines.append(f"Category {cat}: {count} parts updated, {state['next_offset'] or state['total']} of {state['total']} synced")
+            wx.MessageBox("\n".join(lines), "Catalog Refreshed", wx.OK | wx.ICON_INFORMATION)
+        except Exception as e:
+            wx.MessageBox(f"Catalog Error: {e}", "Error", wx.OK | wx.ICON_ERROR)
+
+    def _generate(self, processed_data, rendered=None):
+        # Offer an existing footprint that is within tolerance before adding a near duplicate
+        similar = find_similar_footprint(processed_data)
+        if similar:
+            new_name = processed_data['footprint_name'].replace('.kicad_mod', '')
+            old_name = similar.replace('.kicad_mod', '')
+            answer = wx.MessageBox(f"{old_name} already exists and is within tolerance of {new_name}.\n\nUse the existing footprint?",
+                                   "Similar Footprint", wx.YES_NO | wx.ICON_QUESTION)
+            if answer == wx.YES:
+                # The symbol names its footprint, so it has to be rendered again
+                return generate_library_files(use_footprint(processed_data, similar))
+        return generate_library_files(processed_data, rendered)
+
+    def _more_pages(self, first_page, search_page):
+        """
+        Generator over the pages after the first one, the dialog drains it on a background thread.
+        """
+        if search_page is None:
+            return None
+        pages = iter_search_pages(search_page, self.state.get('max_results', DEFAULT_MAX_RESULTS), first_page=first_page)
+        next(pages) # Page 1 is already on screen
+        return pages
+
+    def get_token(self, force_refresh=False):
+        with self.token_lock:
+            if self.token_manager is None or self.token_manager.client_id != self.client_id:
+                self.token_manager = TokenManager(self.client_id, self.client_secret)
+            token_manager = self.token_manager
+        with span("get_token", phase="Getting a DigiKey token", force_refresh=force_refresh):
+            return token_manager.get(force_refresh=force_refresh)
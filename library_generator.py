@@ -0,0 +1,216 @@
+import os
+import json
+from .symbol_library import append_symbol, commit_symbols
+from .template_registry import render
+from .footprint_index import get_footprint_index, DEFAULT_TOLERANCE
+from .library_manifest import get_manifest
+from .perf_log import span, timed
+
+# KICADCOMPMAKER_DEBUG=1 prints the processed data of every generated part
+DEBUG_DUMP = os.environ.get("KICADCOMPMAKER_DEBUG", "0") == "1"
+
+# Category id and library settings for each capacitor tab
+CAPACITOR_CONFIGS = {
+    'alum': ('58', {'designator': 'CP', 'sym_lib': 'CP_TH_emDashGameChanger', 'proc': 'alum'}),
+    'film': ('60', {'designator': 'C', 'sym_lib': 'C_TH_emDashGameChanger', 'proc': 'disc'}),
+    'mica': ('61', {'designator': 'C', 'sym_lib': 'C_TH_emDashGameChanger', 'proc': 'disc'})
+}
+
+DEFAULT_FP_TEMPLATE = "footprintTemplates/TH_ResistorTemplate.kicad_mod"
+DEFAULT_SYM_TEMPLATE = "symbolTemplates/ResistorSymbolTemplate.txt"
+DEFAULT_SYM_PREAMBLE = '(kicad_symbol_lib\n\t(version 20231120)\n\t(generator "emDashGameChanger\'s resistor generator")\n\t(generator_version ".01")\n'
+
+def footprint_lib_path(fp_lib_name):
+    return os.path.expanduser(f"~/.local/share/kicad/9.0/footprints/{fp_lib_name}.pretty")
+
+def symbol_lib_path(sym_lib_name):
+    return os.path.expanduser(f"~/.local/share/kicad/9.0/symbols/{sym_lib_name}.kicad_sym")
+
+def local_symbol_lib_path(sym_lib_name):
+    # Copy kept in the plugin folder
+    return os.path.join(os.path.dirname(__file__), f"{sym_lib_name}.kicad_sym")
+
+def find_similar_footprint(data, tolerance=DEFAULT_TOLERANCE):
+    """
+    An existing footprint within tolerance of the one data would generate, or None.
+    Nothing is returned when the exact footprint already exists, that one is reused anyway.
+    """
+    fp_lib_path = footprint_lib_path(data.get("fp_lib_name", "Digikey_Import_FP"))
+    if os.path.exists(os.path.join(fp_lib_path, data['footprint_name'])):
+        return None
+    match = get_footprint_index().nearest(fp_lib_path, data['footprint_name'], tolerance)
+    return match[0] if match else None
+
+def use_footprint(data, footprint_name):
+    """
+    Point processed part data at an existing footprint instead of generating a new one.
+    """
+    data = dict(data)
+    data['footprint_name'] = footprint_name
+    sym_data = dict(data['Symbol Data'])
+    sym_data['footprint'] = f"{data.get('fp_lib_name', 'Digikey_Import_FP')}:{footprint_name.replace('.kicad_mod', '')}"
+    data['Symbol Data'] = sym_data
+    return data
+
+def render_part(data):
+    """
+    Render the footprint and symbol for processed part data without writing anything.
+    The result can be handed to generate_library_files so OK only has to do the file writes.
+    """
+    with span("render", phase="Rendering templates"):
+        return {
+            "footprint": render(data.get("fp_template", DEFAULT_FP_TEMPLATE), data['Footprint Data']),
+            "symbol": render(data.get("sym_template", DEFAULT_SYM_TEMPLATE), data['Symbol Data'])
+        }
+
+@timed("generate_library_files")
+def generate_library_files(data, rendered=None):
+    # Debug: Display variables
+    if DEBUG_DUMP:
+        print("DEBUG: Generating Library Files with Data:")
+        print(json.dumps(data, indent=4, default=str))
+
+    # Paths
+    fp_lib_name = data.get("fp_lib_name", "Digikey_Import_FP")
+    sym_lib_name = data.get("sym_lib_name", "Digikey_Import")
+    
+    fp_lib_path = footprint_lib_path(fp_lib_name)
+    sym_lib_file = symbol_lib_path(sym_lib_name)
+    
+    # Ensure directories exist
+    if not os.path.exists(fp_lib_path):
+        os.makedirs(fp_lib_path)
+    if not os.path.exists(os.path.dirname(sym_lib_file)):
+        os.makedirs(os.path.dirname(sym_lib_file))
+        
+    # 1. Footprint Generation
+    fp_name = data['footprint_name']
+    fp_file_path = os.path.join(fp_lib_path, fp_name)
+    fp_template_file = data.get("fp_template", DEFAULT_FP_TEMPLATE)
+    
+    try:
+        if rendered:
+            rendered_fp = rendered["footprint"]
+        else:
+            rendered_fp = render(fp_template_file, data['Footprint Data'])
+        
+        # Write to global library
+        if not os.path.exists(fp_file_path):
+            with span("write_footprint", phase="Writing the footprint"):
+                with open(fp_file_path, 'w') as f:
+                    f.write(rendered_fp)
+            get_footprint_index().add(fp_lib_path, fp_name)
+            get_manifest().record_footprint(fp_file_path, fp_template_file, data['Footprint Data'])
+            
+    except Exception as e:
+        return False, f"Footprint Error: {e}"
+
+    # 2. Symbol Generation
+    sym_data = data['Symbol Data']
+    symbol_name = sym_data['symbol']
+    
+    sym_preamble = data.get("sym_preamble", DEFAULT_SYM_PREAMBLE)
+    sym_template_file = data.get("sym_template", DEFAULT_SYM_TEMPLATE)
+    
+    try:
+        if rendered:
+            rendered_sym = rendered["symbol"]
+        else:
+            rendered_sym = render(sym_template_file, sym_data)
+        
+        with span("write_symbol", phase="Writing the symbol libraries"):
+            # Write to global library, then to the local plugin folder
+            for lib_file in (sym_lib_file, local_symbol_lib_path(sym_lib_name)):
+                if append_symbol(lib_file, symbol_name, rendered_sym, sym_preamble):
+                    get_manifest().record_symbol(lib_file, symbol_name, sym_template_file, sym_data, sym_preamble)
+
+    except Exception as e:
+        return False, f"Symbol Error: {e}"
+
+    return True, f"Generated: {symbol_name}"
+
+def _write_atomic(path, content):
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, 'w') as f:
+        f.write(content)
+        # On disk before the rename, or a crash can leave an empty file under the real name
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+class LibraryBatch:
+    """
+    Collects rendered parts in memory and writes them with one commit per library.
+    Footprints are separate files and go in with an atomic replace each, symbols are grouped
+    by target .kicad_sym so every library is read and replaced once however many parts it gets.
+    """
+    def __init__(self):
+        self.parts = [] # (data, rendered or None, error or None)
+
+    def add(self, data, rendered=None):
+        try:
+            if rendered is None:
+                rendered = render_part(data)
+            self.parts.append((data, rendered, None))
+        except Exception as e:
+            self.parts.append((data, None, e))
+
+    def commit(self):
+        """
+        Returns one (success, message) per added part, in the order they were added.
+        """
+        outcomes = [None] * len(self.parts)
+        sym_groups = {} # lib path -> (preamble, [(part index, name, block)])
+        global_libs = set()
+        existing = set()
+        manifest = get_manifest()
+
+        with manifest.batch():
+            for i, (data, rendered, error) in enumerate(self.parts):
+                if error is not None:
+                    outcomes[i] = (False, f"Render Error: {error}")
+                    continue
+
+                fp_lib_path = footprint_lib_path(data.get("fp_lib_name", "Digikey_Import_FP"))
+                fp_file_path = os.path.join(fp_lib_path, data['footprint_name'])
+                try:
+                    os.makedirs(fp_lib_path, exist_ok=True)
+                    if not os.path.exists(fp_file_path):
+                        _write_atomic(fp_file_path, rendered["footprint"])
+                        get_footprint_index().add(fp_lib_path, data['footprint_name'])
+                        manifest.record_footprint(fp_file_path, data.get("fp_template", DEFAULT_FP_TEMPLATE), data['Footprint Data'])
+                except Exception as e:
+                    outcomes[i] = (False, f"Footprint Error: {e}")
+                    continue
+
+                sym_lib_name = data.get("sym_lib_name", "Digikey_Import")
+                preamble = data.get("sym_preamble", DEFAULT_SYM_PREAMBLE)
+                name = data['Symbol Data']['symbol']
+                global_libs.add(symbol_lib_path(sym_lib_name))
+                for lib_path in (symbol_lib_path(sym_lib_name), local_symbol_lib_path(sym_lib_name)):
+                    group = sym_groups.setdefault(lib_path, (preamble, []))
+                    group[1].append((i, name, rendered["symbol"]))
+
+            for lib_path, (preamble, entries) in sym_groups.items():
+                try:
+                    os.makedirs(os.path.dirname(lib_path), exist_ok=True)
+                    added = commit_symbols(lib_path, [(name, block) for _, name, block in entries], preamble)
+                    if lib_path in global_libs:
+                        existing.update(i for i, name, _ in entries if not added.get(name))
+                    recorded = set()
+                    for i, name, _ in entries:
+                        if added.get(name) and name not in recorded:
+                            data = self.parts[i][0]
+                            manifest.record_symbol(lib_path, name, data.get("sym_template", DEFAULT_SYM_TEMPLATE), data['Symbol Data'], preamble)
+                            recorded.add(name)
+                except Exception as e:
+                    for i, _, _ in entries:
+                        outcomes[i] = (False, f"Symbol Error: {e}")
+
+        for i, (data, _, _) in enumerate(self.parts):
+            if outcomes[i] is None and i in existing:
+                outcomes[i] = (True, f"Already in library: {data['Symbol Data']['symbol']}")
+            elif outcomes[i] is None:
+                outcomes[i] = (True, f"Generated: {data['Symbol Data']['symbol']}")
+        self.parts = []
+        return outcomes
@@ -0,0 +1,167 @@
+import os
+import json
+import sqlite3
+import hashlib
+import threading
+from contextlib import contextmanager
+
+PLUGIN_DIR = os.path.dirname(os.path.abspath(__file__))
+MANIFEST_PATH = os.path.join(PLUGIN_DIR, "library_manifest.sqlite3")
+
+INSERT_ROW = "INSERT OR REPLACE INTO outputs VALUES (?, ?, ?, ?, ?, ?, ?)"
+UPDATE_HASH = "UPDATE outputs SET hash = ? WHERE kind = ? AND path = ? AND name = ?"
+
+_hashes = {} # template path -> (mtime_ns, size, sha256)
+_hashes_lock = threading.Lock()
+
+def template_hash(template_file):
+    """
+    sha256 of a template file (relative to the plugin folder), rehashed only when its mtime or size changes.
+    """
+    path = os.path.join(PLUGIN_DIR, template_file)
+    st = os.stat(path)
+    with _hashes_lock:
+        entry = _hashes.get(path)
+        if entry is not None and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+            return entry[2]
+    with open(path, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    with _hashes_lock:
+        _hashes[path] = (st.st_mtime_ns, st.st_size, digest)
+    return digest
+
+class LibraryManifest:
+    """
+    What every generated footprint and symbol was rendered from: the template, its hash and the processed data.
+    Footprints are keyed by file path, symbols by library path and symbol name. With it a template fix can be
+    carried over to the parts already in the libraries without searching DigiKey again (see regenerate.py).
+
+    Each output is one row of a SQLite table, so recording a part writes that row and nothing else, and the
+    plugin and a batch import running at once both keep their entries. Inside batch() the rows are held back
+    and written in one transaction when it ends.
+    """
+    def __init__(self, path=MANIFEST_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        if not self.path:
+            return
+        with self._connect() as conn:
+            created = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'outputs'").fetchone() is None
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS outputs ("
+                "kind TEXT, path TEXT, name TEXT, template TEXT, hash TEXT, data TEXT, preamble TEXT, "
+                "PRIMARY KEY (kind, path, name))"
+            )
+        if created:
+            self._import_json(os.path.splitext(self.path)[0] + ".json")
+
+    def _connect(self):
+        # New connection per call so worker threads never share a sqlite handle
+        return sqlite3.connect(self.path, timeout=10)
+
+    def _import_json(self, json_path):
+        # Carry over the entries of the library_manifest.json older versions rewrote on every generate
+        if not os.path.exists(json_path):
+            return
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+        except Exception as e:
+            print(f"Could not read the old library manifest: {e}")
+            return
+        if stored.get("version") != 1:
+            return
+        rows = [self._row("footprint", path, "", entry.get("template"), entry.get("data", {}), entry.get("hash"))
+                for path, entry in stored.get("footprints", {}).items()]
+        for lib_path, symbols in stored.get("symbols", {}).items():
+            rows.extend(self._row("symbol", lib_path, name, entry.get("template"), entry.get("data", {}),
+                                  entry.get("hash"), entry.get("preamble")) for name, entry in symbols.items())
+        self._write(INSERT_ROW, rows)
+
+    @staticmethod
+    def _row(kind, path, name, template_file, data, digest, preamble=None):
+        return (kind, path, name, template_file, digest, json.dumps(data, default=str, separators=(",", ":")), preamble)
+
+    def _write(self, statement, rows):
+        if not self.path or not rows:
+            return
+        pending = getattr(self.local, "pending", None)
+        if pending is not None:
+            pending.extend((statement, row) for row in rows)
+            return
+        self._execute([(statement, row) for row in rows])
+
+    def _execute(self, writes):
+        if not writes:
+            return
+        try:
+            with self.lock, self._connect() as conn:
+                for statement, row in writes:
+                    conn.execute(statement, row)
+        except sqlite3.Error as e:
+            print(f"Could not save the library manifest: {e}")
+
+    @contextmanager
+    def batch(self):
+        """
+        Hold back what is recorded on this thread and write it in one transaction at the end.
+        """
+        if getattr(self.local, "pending", None) is not None:
+            yield
+            return
+        self.local.pending = []
+        try:
+            yield
+        finally:
+            writes, self.local.pending = self.local.pending, None
+            self._execute(writes)
+
+    def _hash(self, template_file):
+        try:
+            return template_hash(template_file)
+        except OSError:
+            return None
+
+    def record_footprint(self, fp_file_path, template_file, data):
+        self._write(INSERT_ROW, [self._row("footprint", fp_file_path, "", template_file, data, self._hash(template_file))])
+
+    def record_symbol(self, lib_path, symbol_name, template_file, data, preamble):
+        self._write(INSERT_ROW, [self._row("symbol", lib_path, symbol_name, template_file, data, self._hash(template_file), preamble)])
+
+    def set_hash(self, kind, key, digest):
+        """
+        Mark an output as rendered from the template with this hash, key is the footprint path
+        or (library path, symbol name).
+        """
+        path, name = (key, "") if kind == "footprint" else key
+        self._write(UPDATE_HASH, [(digest, kind, path, name)])
+
+    def entries(self):
+        """
+        ("footprint", path, entry) and ("symbol", (lib path, name), entry) for everything recorded.
+        """
+        if not self.path:
+            return []
+        with self._connect() as conn:
+            rows = conn.execute("SELECT kind, path, name, template, hash, data, preamble FROM outputs "
+                                "ORDER BY kind, path, rowid").fetchall()
+        found = []
+        for kind, path, name, template_file, digest, data, preamble in rows:
+            entry = {"template": template_file, "hash": digest, "data": json.loads(data)}
+            if kind == "footprint":
+                found.append((kind, path, entry))
+            else:
+                entry["preamble"] = preamble
+                found.append((kind, (path, name), entry))
+        return found
+
+_manifest = None
+_manifest_lock = threading.Lock()
+
+def get_manifest():
+    global _manifest
+    with _manifest_lock:
+        if _manifest is None:
+            _manifest = LibraryManifest()
+        return _manifest
@@ -0,0 +1,142 @@
+"""
+Timing spans for the search -> process -> render -> write pipeline.
+
+Set KICADCOMPMAKER_PERF=1 to write one JSON line per span to perf.log next to the plugin,
+rotated at 1 MB with 3 backups:
+
+    {"span": "http", "ms": 412.3, "parent": "search_resistor", "thread": "...", "ok": true, "status": 200}
+
+When it is off, span() hands back a shared no-op and timed() returns the function undecorated.
+The phase (what the worker is doing right now) is always kept on the thread's active SearchControl, in a slot
+of that thread's own, where the search's ProgressCounterDialog reads it. Threads without one, like the
+prefetcher, report nothing.
+"""
+import os
+import json
+import time
+import logging
+import threading
+import functools
+from logging.handlers import RotatingFileHandler
+from .cancellation import current_control
+
+PLUGIN_DIR = os.path.dirname(os.path.abspath(__file__))
+LOG_PATH = os.path.join(PLUGIN_DIR, "perf.log")
+LOG_MAX_BYTES = 1024 * 1024
+LOG_BACKUPS = 3
+
+ENABLED = os.environ.get("KICADCOMPMAKER_PERF", "0") == "1"
+
+_logger = None
+_logger_lock = threading.Lock()
+_local = threading.local()
+
+def _get_logger():
+    global _logger
+    with _logger_lock:
+        if _logger is None:
+            logger = logging.getLogger("KicadCompMaker.perf")
+            logger.propagate = False
+            logger.setLevel(logging.INFO)
+            handler = RotatingFileHandler(LOG_PATH, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding='utf-8')
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+            _logger = logger
+        return _logger
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **fields):
+        pass
+
+_NULL_SPAN = _NullSpan()
+
+class _Phased:
+    """
+    Wraps a span to show its phase on a SearchControl while it runs, in this thread's slot of the control.
+    """
+    def __init__(self, control, phase, inner):
+        self.control = control
+        self.phase = phase
+        self.inner = inner
+
+    def __enter__(self):
+        self.control.enter_phase(self.phase)
+        return self.inner.__enter__()
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            return self.inner.__exit__(exc_type, exc, tb)
+        finally:
+            self.control.exit_phase()
+
+class Span:
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = fields
+        self.start = 0.0
+        self.parent = None
+
+    def set(self, **fields):
+        """
+        Attach values only known once the work is done, e.g. the HTTP status or a byte count.
+        """
+        self.fields.update(fields)
+
+    def __enter__(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        self.parent = stack[-1].name if stack else None
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        _local.stack.pop()
+        record = {
+            "ts": round(time.time(), 3),
+            "span": self.name,
+            "ms": round(elapsed * 1000, 3),
+            "parent": self.parent,
+            "thread": threading.current_thread().name,
+            "ok": exc_type is None
+        }
+        record.update(self.fields)
+        try:
+            _get_logger().info(json.dumps(record, default=str))
+        except Exception:
+            # Instrumentation never breaks the pipeline
+            pass
+        return False
+
+def span(name, phase=None, **fields):
+    """
+    with span("http", phase="Waiting for DigiKey", category="53") as s: ...
+    The phase is shown by the progress dialog whether or not logging is on.
+    """
+    inner = Span(name, fields) if ENABLED else _NULL_SPAN
+    control = current_control() if phase is not None else None
+    if control is None:
+        return inner
+    return _Phased(control, phase, inner)
+
+def timed(name):
+    """
+    Decorator form of span(), free when logging is off because the function is returned as is.
+    """
+    def decorate(fn):
+        if not ENABLED:
+            return fn
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with Span(name, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
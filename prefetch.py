@@ -0,0 +1,219 @@
+"""
+Background warm-up of the search cache for standard E-series values.
+
+Off by default. Turn it on with KICADCOMPMAKER_PREFETCH=1 or a prefetch.json next to the plugin:
+
+    {
+        "enabled": true,
+        "series": "E12",
+        "resistor_decades": [1, 2, 3, 4, 5],
+        "resistor_power_idx": [1],
+        "resistor_tol_idx": [1, 3],
+        "alum_decades": [-6, -5, -4],
+        "alum_voltages": ["16v", "25v", "50v"],
+        "alum_type_idx": [1],
+        "requests_per_minute": 10,
+        "quota_share": 0.1
+    }
+
+Decades are powers of ten: resistor decade 3 is 1k to 8.2k, capacitor decade -6 is 1µ to 8.2µ.
+Indexes follow the radio buttons in DigikeyDialog. Only first pages are fetched, and only
+while the importer has been idle for idle_seconds.
+"""
+import os
+import json
+import time
+import threading
+from .search_cache import network_fetches, MAX_ENTRIES
+from .rate_limiter import get_rate_limiter, QuotaExceeded
+from .TH_Resistors import search_tht_resistor
+from .TH_Radial_ElectrolyticCapacitors import search_tht_capacitor
+from .TH_Disc_Capacitors import search_tht_disc_capacitor
+
+PLUGIN_DIR = os.path.dirname(os.path.abspath(__file__))
+CONFIG_PATH = os.path.join(PLUGIN_DIR, "prefetch.json")
+
+E_SERIES = {
+    "E6": [1.0, 1.5, 2.2, 3.3, 4.7, 6.8],
+    "E12": [1.0, 1.2, 1.5, 1.8, 2.2, 2.7, 3.3, 3.9, 4.7, 5.6, 6.8, 8.2],
+    "E24": [1.0, 1.1, 1.2, 1.3, 1.5, 1.6, 1.8, 2.0, 2.2, 2.4, 2.7, 3.0,
+            3.3, 3.6, 3.9, 4.3, 4.7, 5.1, 5.6, 6.2, 6.8, 7.5, 8.2, 9.1]
+}
+
+DEFAULT_CONFIG = {
+    "enabled": False,
+    "series": "E12",
+    "resistor_decades": [1, 2, 3, 4, 5],
+    "resistor_power_idx": [1],   # 1/4 W
+    "resistor_tol_idx": [1, 3],  # 1% and 5%
+    "alum_decades": [-6, -5, -4],
+    "alum_voltages": ["16v", "25v", "50v"],
+    "alum_type_idx": [1],        # Radial
+    "disc_decades": [],
+    "disc_voltages": ["50v"],
+    "requests_per_minute": 10,
+    "quota_share": 0.1,
+    "daily_quota": None,         # None uses the limit learned from DigiKey's headers
+    "idle_seconds": 30
+}
+
+# Leave most of the LRU cache for the user's own searches
+MAX_JOBS = MAX_ENTRIES // 2
+
+_last_activity = 0.0
+
+def note_activity():
+    """
+    Called whenever the user searches, the prefetcher backs off until they have been idle a while.
+    """
+    global _last_activity
+    _last_activity = time.time()
+
+def load_config(path=CONFIG_PATH):
+    config = dict(DEFAULT_CONFIG)
+    if os.path.exists(path):
+        try:
+            with open(path, 'r') as f:
+                config.update(json.load(f))
+        except Exception as e:
+            print(f"Ignoring {path}: {e}")
+    env = os.environ.get("KICADCOMPMAKER_PREFETCH")
+    if env is not None:
+        config["enabled"] = env != "0"
+    return config
+
+def _series_values(series, decades):
+    mantissas = E_SERIES.get(series, E_SERIES["E12"])
+    for decade in decades:
+        for m in mantissas:
+            # Float noise (4700.000000000001) disappears in the :g formatting below
+            yield m * 10 ** decade
+
+def format_resistance(ohms):
+    """
+    The same text a user types in the resistor box: 47, 4.7k, 1M.
+    """
+    if ohms >= 1e6:
+        return f"{ohms / 1e6:g}M"
+    if ohms >= 1e3:
+        return f"{ohms / 1e3:g}k"
+    return f"{ohms:g}"
+
+def format_capacitance(farads):
+    """
+    The same text a user types in the capacitor box once u becomes µ: 100p, 4.7n, 22µ.
+    """
+    if farads >= 1e-6:
+        return f"{farads * 1e6:g}µ"
+    if farads >= 1e-9:
+        return f"{farads * 1e9:g}n"
+    return f"{farads * 1e12:g}p"
+
+def build_jobs(config, search):
+    """
+    (label, callable) pairs for every value and rating combination in the config.
+    search is the importer's search function, search(kind, *args) with kind 'resistor' or 'capacitor'.
+    """
+    jobs = []
+    series = config["series"]
+    for ohms in _series_values(series, config["resistor_decades"]):
+        for pwr_idx in config["resistor_power_idx"]:
+            for tol_idx in config["resistor_tol_idx"]:
+                value = format_resistance(ohms)
+                jobs.append((f"R {value} p{pwr_idx} t{tol_idx}",
+                             lambda v=value, p=pwr_idx, t=tol_idx: search("resistor", v, p, t)))
+    for farads in _series_values(series, config["alum_decades"]):
+        for vol in config["alum_voltages"]:
+            for type_idx in config["alum_type_idx"]:
+                value = format_capacitance(farads)
+                jobs.append((f"CP {value} {vol}",
+                             lambda v=value, vol=vol, t=type_idx: search("capacitor", v, vol, t, "58")))
+    for farads in _series_values(series, config["disc_decades"]):
+        for vol in config["disc_voltages"]:
+            value = format_capacitance(farads)
+            jobs.append((f"C {value} {vol}", lambda v=value, vol=vol: search("capacitor", v, vol, 0, "60")))
+    return jobs[:MAX_JOBS]
+
+class Prefetcher(threading.Thread):
+    """
+    Runs the jobs on a daemon thread. Cache hits cost nothing, every job that had to go to
+    DigiKey is followed by a pause of 60 / requests_per_minute seconds, and the thread stops
+    once today's prefetch calls, counted by the rate limiter across sessions, reach max_calls.
+    """
+    def __init__(self, jobs, requests_per_minute, max_calls, idle_seconds, limiter=None):
+        threading.Thread.__init__(self, name="KicadCompMaker prefetch", daemon=True)
+        self.jobs = jobs
+        self.interval = 60.0 / max(requests_per_minute, 0.1)
+        self.max_calls = max_calls
+        self.idle_seconds = idle_seconds
+        self.limiter = limiter or get_rate_limiter()
+        self.calls = 0
+        self.done = 0
+        self.stopped = threading.Event()
+
+    def stop(self):
+        self.stopped.set()
+
+    def _wait_for_idle(self):
+        while not self.stopped.is_set():
+            idle = time.time() - _last_activity
+            if idle >= self.idle_seconds:
+                return
+            self.stopped.wait(self.idle_seconds - idle)
+
+    def run(self):
+        for label, job in self.jobs:
+            if self.limiter.prefetched_today() >= self.max_calls:
+                print(f"KicadCompMaker prefetch: quota share used after {self.done} searches")
+                break
+            self._wait_for_idle()
+            if self.stopped.is_set():
+                break
+            before = network_fetches()
+            try:
+                job()
+            except QuotaExceeded as e:
+                print(f"KicadCompMaker prefetch: {e}")
+                break
+            except Exception as e:
+                print(f"KicadCompMaker prefetch: {label} failed: {e}")
+            self.done += 1
+            if network_fetches() > before:
+                self.calls += 1
+                self.limiter.count_prefetch()
+                self.stopped.wait(self.interval)
+
+_prefetcher = None
+
+def start_prefetch(search, config=None):
+    """
+    Start warming the cache unless it is disabled or already running. Returns the Prefetcher or None.
+    """
+    global _prefetcher
+    config = config or load_config()
+    if not config.get("enabled"):
+        return None
+    if _prefetcher is not None and _prefetcher.is_alive():
+        return _prefetcher
+    limiter = get_rate_limiter()
+    daily_quota = config["daily_quota"] or limiter.daily_limit
+    max_calls = int(daily_quota * config["quota_share"])
+    _prefetcher = Prefetcher(build_jobs(config, search), config["requests_per_minute"], max_calls, config["idle_seconds"], limiter)
+    _prefetcher.start()
+    return _prefetcher
+
+def make_search(token_getter, client_id):
+    """
+    The search callable for build_jobs, going through the same functions and cache as the dialog.
+    A token is only asked for when a search misses the cache.
+    """
+    refresher = lambda: token_getter(force_refresh=True)
+    def search(kind, *args):
+        if kind == "resistor":
+            value, pwr_idx, tol_idx = args
+            return search_tht_resistor(value, pwr_idx, tol_idx, token_getter, client_id, refresher)
+        value, vol, type_idx, cat_id = args
+        if cat_id == "60":
+            return search_tht_disc_capacitor(value, vol, cat_id, token_getter, client_id, refresher)
+        return search_tht_capacitor(value, vol, type_idx, cat_id, token_getter, client_id, refresher)
+    return search
@@ -0,0 +1,121 @@
+import re
+import collections
+
+# Dimension parsers, compiled once for every generator
+RESISTOR_DIMS_RE = re.compile(r'([0-9]+\.[0-9]+)mm\sx\s([0-9]+\.[0-9]+)mm')
+DIM_MM_RE = re.compile(r'\(?(\d+\.?\d*)\s*mm\)?')
+PITCH_MM_RE = re.compile(r'\(?([\d\.]+)\s*mm\)?')
+LXW_MM_RE = re.compile(r'\(([\d\.]+)\s*mm\s*x\s*([\d\.]+)\s*mm\)')
+DESC_VOLTAGE_RE = re.compile(r'(\d+(\.\d+)?)\s*V')
+CAP_VALUE_RE = re.compile(r'^([\d\.]+)\s*([µumkM]?)F$')
+
+# DigiKey ParameterId -> (field name, which value to read) for each part family
+SCHEMAS = {
+    "resistor": {
+        2085: ("resistance", "ValueId"),
+        3: ("tolerance", "ValueText"),
+        2: ("power", "ValueText"),
+        46: ("dims_raw", "ValueText"),
+        16: ("type_id", "ValueId"),
+        69: ("mount_id", "ValueId")
+    },
+    "alum": {
+        2049: ("capacitance", "ValueText"),
+        3: ("tolerance", "ValueText"),
+        2079: ("voltage", "ValueText"),
+        508: ("lead_spacing", "ValueText"),
+        46: ("diameter_raw", "ValueText"),
+        1500: ("height_raw", "ValueText"),
+        16: ("type_id", "ValueId"),
+        69: ("mount_id", "ValueId")
+    },
+    "disc": {
+        2049: ("capacitance", "ValueText"),
+        3: ("tolerance", "ValueText"),
+        2079: ("voltage", "ValueText"),
+        508: ("lead_spacing", "ValueText"),
+        46: ("diameter_raw", "ValueText"),
+        16: ("type_id", "ValueId"),
+        69: ("mount_id", "ValueId")
+    },
+    # What the result list and the batch import pick from, no parameters
+    "listing": {}
+}
+
+# UnitPrice fallback and DigiKey PN package preference per family.
+# Ordered means try each package id in turn (Cut Tape before Tape & Reel),
+# otherwise take the first variation that is any of them.
+FAMILY_OPTIONS = {
+    "resistor": {"price_default": 999.99, "package_ids": (2, 1), "ordered": True},
+    "alum": {"price_default": 999.99, "package_ids": (2, 1), "ordered": True},
+    "disc": {"price_default": 0.0, "package_ids": (1, 2), "ordered": False},
+    "listing": {"price_default": None, "package_ids": (2, 1), "ordered": True}
+}
+
+COMMON_FIELDS = ("mpn", "datasheet", "price", "stock", "description", "dk_pn")
+
+# One record type per family: the common fields, then the schema's fields in order
+RECORD_TYPES = {
+    family: collections.namedtuple(f"{family.capitalize()}Record", COMMON_FIELDS + tuple(field for field, _ in schema.values()))
+    for family, schema in SCHEMAS.items()
+}
+
+# ParameterId -> (position in the family's record, which value to read)
+SCHEMA_POSITIONS = {
+    family: {pid: (len(COMMON_FIELDS) + i, key) for i, (pid, (_, key)) in enumerate(schema.items())}
+    for family, schema in SCHEMAS.items()
+}
+
+def select_dk_pn(variations, package_ids=(2, 1), ordered=True):
+    if ordered:
+        for package_id in package_ids:
+            for v in variations:
+                if v.get("PackageType", {}).get("Id") == package_id:
+                    return v.get("DigiKeyProductNumber")
+    else:
+        for v in variations:
+            if v.get("PackageType", {}).get("Id") in package_ids:
+                return v.get("DigiKeyProductNumber")
+    if variations:
+        return variations[0].get("DigiKeyProductNumber")
+    return "N/A"
+
+def parse_dim(val, pattern=DIM_MM_RE):
+    """
+    First millimetre value in a DigiKey dimension string, as (float, original text).
+    """
+    if not val or val == "Unknown": return 0.0, "0.0"
+    match = pattern.search(val)
+    if match:
+        return float(match.group(1)), match.group(1)
+    return 0.0, "0.0"
+
+def extract(product_json, family):
+    """
+    One pass over a product: the common fields plus every parameter in the family's schema,
+    as the family's record type. Missing parameters come back as "Unknown".
+    """
+    positions = SCHEMA_POSITIONS[family]
+    options = FAMILY_OPTIONS[family]
+
+    values = [
+        product_json.get("ManufacturerProductNumber", "Unknown"),
+        product_json.get("DatasheetUrl", ""),
+        product_json.get("UnitPrice", options["price_default"]),
+        product_json.get("QuantityAvailable"),
+        product_json.get("Description", {}).get("DetailedDescription", ""),
+        select_dk_pn(product_json.get("ProductVariations", []), options["package_ids"], options["ordered"])
+    ]
+    if positions:
+        values.extend(["Unknown"] * len(positions))
+        for p in product_json.get("Parameters", []):
+            entry = positions.get(p.get("ParameterId"))
+            if entry:
+                values[entry[0]] = p.get(entry[1], "Unknown")
+    return RECORD_TYPES[family]._make(values)
+
+def extract_batch(products, family):
+    """
+    Typed records for a whole results page, products can be any iterable and is read once.
+    """
+    return [extract(p, family) for p in products]
@@ -0,0 +1,147 @@
+import re
+import json
+import threading
+import collections
+from .product_extract import select_dk_pn, extract, extract_batch
+
+# Top level keys of a keyword search response, found without decoding the rest
+PRODUCTS_RE = re.compile(r'"Products"\s*:\s*\[')
+PRODUCTS_COUNT_RE = re.compile(r'"ProductsCount"\s*:\s*(\d+)')
+WHITESPACE_RE = re.compile(r'\s*')
+
+# Decoded pages kept for raw lookups, enough for the row being generated and the one being rendered
+RAW_PAGE_CACHE = 4
+
+# Added to products merged from several searches so the dialog and the processors know where each came from
+VARIANT_KEY = "FanOutVariant"
+
+_decoder = json.JSONDecoder()
+
+class ProductRecord:
+    """
+    What the result list needs from one product, a small fraction of the DigiKey JSON.
+    The full product is loaded again from its search page (normally a cache hit) by raw().
+    """
+    __slots__ = ("mpn", "description", "price", "stock", "key", "variant", "source", "offset", "index")
+
+    def __init__(self, mpn, description, price, stock, key, variant=None, source=None, offset=0, index=0):
+        self.mpn = mpn
+        self.description = description
+        self.price = price
+        self.stock = stock
+        self.key = key
+        self.variant = variant
+        self.source = source
+        self.offset = offset
+        self.index = index
+
+    @classmethod
+    def from_fields(cls, fields, index=0, variant=None):
+        """
+        A record from the "listing" fields product_extract read for a product.
+        """
+        mpn = fields.mpn if fields.mpn != "Unknown" else ""
+        key = fields.dk_pn if fields.dk_pn and fields.dk_pn != "N/A" else mpn
+        return cls(mpn or "N/A", fields.description or "N/A", fields.price, fields.stock, key, variant, index=index)
+
+    @classmethod
+    def from_product(cls, product, index=0, variant=None):
+        return cls.from_fields(extract(product, "listing"), index, variant)
+
+    def raw(self):
+        """
+        The full product JSON, as the processors expect it.
+        """
+        return load_raw(self)
+
+def product_key(product, variations=None):
+    """
+    DigiKey PN of a product, falling back to the manufacturer PN.
+    """
+    dk_pn = select_dk_pn(product.get("ProductVariations", []) if variations is None else variations)
+    if dk_pn and dk_pn != "N/A":
+        return dk_pn
+    return product.get("ManufacturerProductNumber", "")
+
+def iter_products(text):
+    """
+    Decode the Products array of a search response one product at a time,
+    so only one product dict is alive at any point instead of the whole response tree.
+    """
+    match = PRODUCTS_RE.search(text)
+    if not match:
+        return
+    pos = match.end()
+    end = len(text)
+    while pos < end:
+        pos = WHITESPACE_RE.match(text, pos).end()
+        if text.startswith("]", pos):
+            return
+        product, pos = _decoder.raw_decode(text, pos)
+        yield product
+        pos = WHITESPACE_RE.match(text, pos).end()
+        if text.startswith(",", pos):
+            pos += 1
+
+def decode_compact(text):
+    """
+    A search response of ProductRecords straight from the response JSON text.
+    """
+    match = PRODUCTS_COUNT_RE.search(text)
+    products = [ProductRecord.from_fields(fields, i) for i, fields in enumerate(extract_batch(iter_products(text), "listing"))]
+    return {"ProductsCount": int(match.group(1)) if match else len(products), "Products": products}
+
+def compact_response(response):
+    """
+    Same as decode_compact for a response that is already decoded, every other key is kept.
+    """
+    if not isinstance(response, dict) or "Products" not in response:
+        return response
+    products = response["Products"]
+    fields = iter(extract_batch((p for p in products if not isinstance(p, ProductRecord)), "listing"))
+    compact = dict(response)
+    compact["Products"] = [p if isinstance(p, ProductRecord) else ProductRecord.from_fields(next(fields), i)
+                           for i, p in enumerate(products)]
+    return compact
+
+def with_source(response, source, offset=0):
+    """
+    Tell every record of a compact page where its full JSON comes from: source(offset) returns the page.
+    """
+    if isinstance(response, dict):
+        for record in response.get("Products", []):
+            record.source = source
+            record.offset = offset
+    return response
+
+_pages = collections.OrderedDict()
+_pages_lock = threading.Lock()
+
+def _load_page(source, offset):
+    key = (id(source), offset)
+    with _pages_lock:
+        page = _pages.get(key)
+        if page is not None and page[0] is source:
+            _pages.move_to_end(key)
+            return page[1]
+    products = (source(offset) or {}).get("Products", [])
+    with _pages_lock:
+        _pages[key] = (source, products)
+        while len(_pages) > RAW_PAGE_CACHE:
+            _pages.popitem(last=False)
+    return products
+
+def load_raw(record):
+    if record.source is None:
+        raise LookupError(f"No search to load {record.mpn} from")
+    products = _load_page(record.source, record.offset)
+    # Same position first, the page is normally the cached one the record was made from
+    if record.index < len(products) and product_key(products[record.index]) == record.key:
+        product = products[record.index]
+    else:
+        product = next((p for p in products if product_key(p) == record.key), None)
+        if product is None:
+            raise LookupError(f"{record.mpn} is no longer in the search results, search again")
+    if record.variant is not None:
+        product = dict(product, **{VARIANT_KEY: record.variant})
+    return product
@@ -0,0 +1,238 @@
+import os
+import json
+import time
+import atexit
+import threading
+
+PLUGIN_DIR = os.path.dirname(os.path.abspath(__file__))
+QUOTA_STORE = os.path.join(PLUGIN_DIR, "api_quota.json")
+
+# DigiKey defaults until the response headers say otherwise
+DEFAULT_PER_MINUTE = 120
+DEFAULT_PER_DAY = 1000
+
+# Per minute (burst) and per day limits as DigiKey reports them on every response
+BURST_HEADERS = ("X-BurstLimit-Limit", "X-BurstLimit-Remaining")
+DAILY_HEADERS = ("X-RateLimit-Limit", "X-RateLimit-Remaining")
+
+# The daily count is written out after this many changes or seconds, whichever comes first, and at exit
+SAVE_EVERY = 20
+SAVE_INTERVAL = 10.0
+
+class QuotaExceeded(Exception):
+    pass
+
+class SlotTimeout(QuotaExceeded):
+    pass
+
+def _int_header(headers, name):
+    value = headers.get(name)
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+def _today():
+    # DigiKey's daily allowance resets at midnight UTC
+    return time.strftime("%Y-%m-%d", time.gmtime())
+
+class RateLimiter:
+    """
+    Token bucket in front of every DigiKey search.
+    The bucket holds one minute's worth of requests and refills continuously, callers block in acquire()
+    until a token is free. Limits are learned from the response headers, and the daily count is
+    persisted so a new KiCad session or a batch run knows what is left. Writes are batched and done
+    outside the lock, see SAVE_EVERY and SAVE_INTERVAL, flush() writes whatever is pending.
+    """
+    def __init__(self, per_minute=DEFAULT_PER_MINUTE, per_day=DEFAULT_PER_DAY, store_path=QUOTA_STORE):
+        self.per_minute = per_minute
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+        self.hold_until = 0.0
+        self.daily_limit = per_day
+        self.day = _today()
+        self.daily_used = 0
+        self.prefetch_used = 0
+        self.store_path = store_path
+        self.cond = threading.Condition()
+        self.unsaved = 0
+        self.saved_at = time.monotonic()
+        self.version = 0
+        self.written = 0
+        self.save_lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not self.store_path or not os.path.exists(self.store_path):
+            return
+        try:
+            with open(self.store_path, 'r') as f:
+                stored = json.load(f)
+        except Exception:
+            return
+        self.daily_limit = stored.get("daily_limit", self.daily_limit)
+        self.per_minute = stored.get("per_minute", self.per_minute)
+        if stored.get("day") == self.day:
+            self.daily_used = stored.get("used", 0)
+            self.prefetch_used = stored.get("prefetch_used", 0)
+
+    def _changed(self, force=False):
+        """
+        Note a change to what is persisted, called holding cond. Returns the state to write when a save is due,
+        the caller passes it to _write() once it has let go of cond.
+        """
+        self.unsaved += 1
+        now = time.monotonic()
+        if not force and self.unsaved < SAVE_EVERY and now - self.saved_at < SAVE_INTERVAL:
+            return None
+        self.unsaved = 0
+        self.saved_at = now
+        self.version += 1
+        return self.version, {"day": self.day, "used": self.daily_used, "prefetch_used": self.prefetch_used,
+                              "daily_limit": self.daily_limit, "per_minute": self.per_minute}
+
+    def _write(self, pending):
+        if pending is None or not self.store_path:
+            return
+        version, stored = pending
+        with self.save_lock:
+            # Two threads can take their snapshots in one order and get here in the other
+            if version <= self.written:
+                return
+            self.written = version
+            tmp_path = self.store_path + ".tmp"
+            try:
+                with open(tmp_path, 'w') as f:
+                    json.dump(stored, f)
+                os.replace(tmp_path, self.store_path)
+            except OSError as e:
+                print(f"Could not save API quota: {e}")
+
+    def flush(self):
+        """
+        Write the daily count out now if anything changed since the last save.
+        """
+        with self.cond:
+            pending = self._changed(force=True) if self.unsaved else None
+        self._write(pending)
+
+    def _refill(self, now):
+        rate = self.per_minute / 60.0
+        self.tokens = min(float(self.per_minute), self.tokens + (now - self.updated) * rate)
+        self.updated = now
+
+    def _roll_day(self):
+        """
+        Start a new day's count when the date changed. Returns True if it did, the caller should then save.
+        """
+        today = _today()
+        if today == self.day:
+            return False
+        self.day = today
+        self.daily_used = 0
+        self.prefetch_used = 0
+        return True
+
+    def acquire(self, timeout=None):
+        """
+        Wait for a request slot and count it against today's quota.
+        Raises QuotaExceeded when the daily quota is used up or no slot frees up within timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.cond:
+            while True:
+                rolled = self._roll_day()
+                if self.daily_used >= self.daily_limit:
+                    raise QuotaExceeded(f"Daily DigiKey API quota of {self.daily_limit} requests is used up")
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.hold_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    self.daily_used += 1
+                    pending = self._changed(force=rolled)
+                    break
+                wait = max(self.hold_until - now, (1 - self.tokens) * 60.0 / self.per_minute)
+                if deadline is not None:
+                    if now + wait > deadline:
+                        raise SlotTimeout("Timed out waiting for a DigiKey API slot")
+                self.cond.wait(wait)
+        self._write(pending)
+
+    def update(self, headers):
+        """
+        Learn the limits and the server's view of what is left from a response.
+        """
+        with self.cond:
+            burst_limit, burst_left = (_int_header(headers, h) for h in BURST_HEADERS)
+            daily_limit, daily_left = (_int_header(headers, h) for h in DAILY_HEADERS)
+            if burst_limit:
+                self.per_minute = burst_limit
+            if burst_left is not None:
+                self.tokens = min(self.tokens, float(burst_left))
+            if daily_limit:
+                self.daily_limit = daily_limit
+            if daily_limit and daily_left is not None:
+                # The server is the authority, it also counts calls made by other tools with this client id
+                self.daily_used = max(0, daily_limit - daily_left)
+            pending = self._changed()
+            self.cond.notify_all()
+        self._write(pending)
+
+    def count_prefetch(self):
+        """
+        One DigiKey call was made by the background prefetcher. Returns today's prefetch total, which is
+        persisted with the daily count so the prefetch share holds across KiCad sessions.
+        """
+        with self.cond:
+            rolled = self._roll_day()
+            self.prefetch_used += 1
+            count = self.prefetch_used
+            pending = self._changed(force=rolled)
+        self._write(pending)
+        return count
+
+    def prefetched_today(self):
+        with self.cond:
+            pending = self._changed(force=True) if self._roll_day() else None
+            count = self.prefetch_used
+        self._write(pending)
+        return count
+
+    def penalize(self, retry_after):
+        """
+        A 429 came back, nobody sends anything for retry_after seconds.
+        """
+        with self.cond:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens = 0.0
+            self.hold_until = max(self.hold_until, now + retry_after)
+
+    def remaining(self):
+        with self.cond:
+            pending = self._changed(force=True) if self._roll_day() else None
+            self._refill(time.monotonic())
+            left = {
+                "per_minute": self.per_minute,
+                "minute_remaining": int(self.tokens),
+                "daily_limit": self.daily_limit,
+                "daily_used": self.daily_used,
+                "daily_remaining": max(0, self.daily_limit - self.daily_used)
+            }
+        self._write(pending)
+        return left
+
+    def summary(self):
+        left = self.remaining()
+        return f"{left['daily_remaining']} of {left['daily_limit']} API calls left today"
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+def get_rate_limiter():
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter()
+            atexit.register(_limiter.flush)
+        return _limiter
@@ -0,0 +1,136 @@
+"""
+Re-render generated parts after a template change.
+
+Every footprint and symbol the plugin writes is recorded in library_manifest.sqlite3 with the template it came
+from, the template's hash and the processed data. This finds the outputs whose template has changed since,
+renders only those on a process pool and swaps them in place: footprints with an atomic replace each, symbols
+with one atomic replace per .kicad_sym. No DigiKey calls are made. From the plugins folder, with KiCad's python:
+
+    python -m KicadCompMaker.regenerate            # re-render what is stale
+    python -m KicadCompMaker.regenerate --dry-run  # only list it
+    python -m KicadCompMaker.regenerate --force    # re-render everything recorded
+
+Parts generated before the manifest existed are not tracked, generate them again to pick them up.
+"""
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from .template_registry import render
+from .library_manifest import get_manifest, template_hash
+from .library_generator import _write_atomic
+from .symbol_library import replace_symbols
+
+DEFAULT_WORKERS = os.cpu_count() or 4
+
+# Below this many renders starting the worker processes costs more than it saves
+POOL_THRESHOLD = 32
+
+def find_stale(manifest, force=False):
+    """
+    (jobs, skipped). A job is (kind, key, template, data, current hash) for an output whose template changed,
+    skipped lists (kind, key, reason) for outputs that can not be regenerated.
+    """
+    jobs = []
+    skipped = []
+    for kind, key, entry in manifest.entries():
+        template = entry.get("template")
+        try:
+            digest = template_hash(template)
+        except (OSError, TypeError):
+            skipped.append((kind, key, f"template {template} not found"))
+            continue
+        if entry.get("hash") == digest and not force:
+            continue
+        output = key if kind == "footprint" else key[0]
+        if not os.path.exists(output):
+            skipped.append((kind, key, "output no longer exists"))
+            continue
+        jobs.append((kind, key, template, entry.get("data", {}), digest))
+    return jobs, skipped
+
+def _render_job(job):
+    # Runs in the worker processes, exceptions come back as text so one bad part does not stop the pool
+    template, data = job
+    try:
+        return render(template, data), None
+    except Exception as e:
+        return None, str(e)
+
+def render_all(jobs, workers=DEFAULT_WORKERS):
+    """
+    [(rendered text or None, error or None)] in job order.
+    """
+    work = [(template, data) for _, _, template, data, _ in jobs]
+    if workers <= 1 or len(work) < POOL_THRESHOLD:
+        return [_render_job(job) for job in work]
+    chunksize = max(1, len(work) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_render_job, work, chunksize=chunksize))
+
+def regenerate(manifest=None, force=False, workers=DEFAULT_WORKERS, dry_run=False):
+    """
+    Re-render and replace every stale output. Returns a summary dict:
+    stale, footprints and symbols written, failed [(key, error)] and skipped [(kind, key, reason)].
+    """
+    manifest = manifest or get_manifest()
+    jobs, skipped = find_stale(manifest, force)
+    summary = {"stale": jobs, "footprints": 0, "symbols": 0, "failed": [], "skipped": skipped}
+    if dry_run or not jobs:
+        return summary
+
+    with manifest.batch():
+        sym_groups = {} # lib path -> {name: (block, hash)}
+        for (kind, key, _, _, digest), (text, error) in zip(jobs, render_all(jobs, workers)):
+            if error is not None:
+                summary["failed"].append((key, error))
+            elif kind == "footprint":
+                try:
+                    _write_atomic(key, text)
+                    manifest.set_hash(kind, key, digest)
+                    summary["footprints"] += 1
+                except OSError as e:
+                    summary["failed"].append((key, str(e)))
+            else:
+                sym_groups.setdefault(key[0], {})[key[1]] = (text, digest)
+
+        for lib_path, symbols in sym_groups.items():
+            try:
+                replaced = replace_symbols(lib_path, {name: block for name, (block, _) in symbols.items()})
+            except OSError as e:
+                summary["failed"].extend(((lib_path, name), str(e)) for name in symbols)
+                continue
+            for name in replaced:
+                manifest.set_hash("symbol", (lib_path, name), symbols[name][1])
+            summary["symbols"] += len(replaced)
+            summary["skipped"].extend(("symbol", (lib_path, name), "no longer in the library") for name in symbols if name not in replaced)
+    return summary
+
+def _describe(kind, key):
+    return key if kind == "footprint" else f"{key[1]} in {key[0]}"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-render generated footprints and symbols whose template changed")
+    parser.add_argument("--force", action="store_true", help="Re-render everything in the manifest")
+    parser.add_argument("--dry-run", action="store_true", help="List the stale outputs without writing anything")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Render processes")
+    args = parser.parse_args(argv)
+
+    start = time.time()
+    summary = regenerate(force=args.force, workers=args.workers, dry_run=args.dry_run)
+    for kind, key, reason in summary["skipped"]:
+        print(f"Skipped {_describe(kind, key)}: {reason}")
+    if args.dry_run:
+        for kind, key, template, _, _ in summary["stale"]:
+            print(f"Stale {_describe(kind, key)} ({template})")
+        print(f"{len(summary['stale'])} outputs to regenerate")
+        return 0
+
+    for key, error in summary["failed"]:
+        print(f"Failed {key}: {error}")
+    print(f"{summary['footprints']} footprints and {summary['symbols']} symbols regenerated in {time.time() - start:.1f}s")
+    return 1 if summary["failed"] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
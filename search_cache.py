@@ -0,0 +1,239 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from .perf_log import span
+from .product_records import decode_compact, compact_response
+from .cancellation import current_control, SearchCancelled, DeadlineExceeded
+from .rate_limiter import SlotTimeout
+
+PLUGIN_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_PATH = os.path.join(PLUGIN_DIR, "search_cache.sqlite3")
+
+# Time to live in seconds per DigiKey category id.
+# Stock and pricing move faster than the parametric data, so keep these to hours not days.
+CATEGORY_TTL = {
+    "53": 12 * 3600, # Through hole resistors
+    "58": 12 * 3600, # Aluminum electrolytic
+    "60": 24 * 3600, # Ceramic disc
+    "61": 24 * 3600  # Mica / PTFE
+}
+DEFAULT_TTL = 6 * 3600
+MAX_ENTRIES = 500
+
+def normalize_payload(payload):
+    """
+    Build the cache key for a keyword search payload.
+    Only the parts that change the result set are kept: category, parameter filters and sort.
+    """
+    filter_opts = payload.get("FilterOptionsRequest", {})
+    param_req = filter_opts.get("ParameterFilterRequest", {})
+    category = str(param_req.get("CategoryFilter", {}).get("id", ""))
+
+    filters = []
+    for f in param_req.get("ParameterFilters", []):
+        # DigiKey accepts both ParameterID and ParameterId, treat them as the same thing
+        pid = f.get("ParameterId", f.get("ParameterID"))
+        values = sorted(str(v.get("Id")) for v in f.get("FilterValues", []))
+        filters.append([int(pid), values])
+    filters.sort()
+
+    key = {
+        "keywords": payload.get("Keywords", ""),
+        "category": category,
+        "filters": filters,
+        "sort": payload.get("SortOptions", {}),
+        "limit": payload.get("Limit"),
+        "offset": payload.get("Offset")
+    }
+    return category, json.dumps(key, sort_keys=True, ensure_ascii=False)
+
+class SearchCache:
+    def __init__(self, path=CACHE_PATH, max_entries=MAX_ENTRIES, ttl_map=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_map = ttl_map if ttl_map is not None else CATEGORY_TTL
+        self.lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS searches ("
+                "key TEXT PRIMARY KEY, category TEXT, response TEXT, "
+                "created REAL, last_access REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON searches(last_access)")
+
+    def _connect(self):
+        # New connection per call so worker threads never share a sqlite handle
+        return sqlite3.connect(self.path, timeout=5)
+
+    def ttl_for(self, category):
+        return self.ttl_map.get(str(category), DEFAULT_TTL)
+
+    def get(self, payload):
+        response = self.get_text(payload)
+        return None if response is None else json.loads(response)
+
+    def get_text(self, payload, allow_stale=False):
+        """
+        The cached response JSON as stored, for callers that decode it their own way.
+        Expired entries stay until LRU eviction, allow_stale returns them when DigiKey cannot be reached in time.
+        """
+        category, key = normalize_payload(payload)
+        now = time.time()
+        with self.lock, self._connect() as conn:
+            row = conn.execute("SELECT response, created FROM searches WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            response, created = row
+            if now - created > self.ttl_for(category) and not allow_stale:
+                return None
+            conn.execute("UPDATE searches SET last_access = ? WHERE key = ?", (now, key))
+        return response
+
+    def put(self, payload, response):
+        category, key = normalize_payload(payload)
+        now = time.time()
+        with self.lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO searches (key, category, response, created, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, category, json.dumps(response, ensure_ascii=False), now, now)
+            )
+            # LRU eviction, drop the least recently used rows over the cap
+            conn.execute(
+                "DELETE FROM searches WHERE key IN ("
+                "SELECT key FROM searches ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def clear(self):
+        with self.lock, self._connect() as conn:
+            conn.execute("DELETE FROM searches")
+
+_cache = None
+_cache_lock = threading.Lock()
+# Per thread count of searches that missed the cache and went to DigiKey
+_fetches = threading.local()
+
+def network_fetches():
+    """
+    Number of cache misses on the calling thread so far, used to pace background work.
+    """
+    return getattr(_fetches, "count", 0)
+
+def _fetch(fetch):
+    _fetches.count = network_fetches() + 1
+    return fetch()
+
+# Normalized payload key -> Future of the search that is on the wire right now
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+# What the owner of a flight raises when it, not the search, gave up: its own cancel, deadline or rate limit wait
+OWNER_GAVE_UP = (SearchCancelled, SlotTimeout)
+
+def single_flight(payload, fetch):
+    """
+    Run fetch() unless an identical search is already in flight, in which case wait for that one
+    and share its result (or its exception). Callers must treat the shared response as read only.
+    When the owner was cancelled or ran out of time the waiters do not inherit that, the first
+    of them to get back in runs fetch() itself and the others wait on it.
+    """
+    _, key = normalize_payload(payload)
+    while True:
+        with _inflight_lock:
+            flight = _inflight.get(key)
+            owner = flight is None
+            if owner:
+                flight = Future()
+                _inflight[key] = flight
+        if owner:
+            break
+        control = current_control()
+        try:
+            return flight.result(timeout=None if control is None else control.remaining())
+        except FutureTimeout:
+            control.check()
+            raise DeadlineExceeded("Search did not finish in time")
+        except OWNER_GAVE_UP:
+            if control is not None:
+                control.check()
+
+    try:
+        try:
+            result = fetch()
+        finally:
+            # Out of the table before the waiters wake up, so a retrying waiter never finds the finished flight
+            with _inflight_lock:
+                del _inflight[key]
+    except BaseException as e:
+        flight.set_exception(e)
+        raise
+    flight.set_result(result)
+    return result
+
+def get_search_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SearchCache()
+        return _cache
+
+def cached_search(payload, fetch, bypass_cache=False, compact=False):
+    """
+    Return the response for payload from the cache, or call fetch() and store the result.
+    With bypass_cache the cache is not read, but a fresh successful result still replaces the old entry.
+    Concurrent misses for the same search share one fetch().
+    With compact the products come back as ProductRecords, decoded one by one from the cached text on a hit.
+    """
+    try:
+        cache = get_search_cache()
+    except sqlite3.Error as e:
+        print(f"Search cache unavailable: {e}")
+        result = single_flight(payload, lambda: _fetch(fetch))
+        return compact_response(result) if compact else result
+
+    if not bypass_cache:
+        with span("cache_get", phase="Checking the search cache") as s:
+            try:
+                hit = cache.get_text(payload)
+            except sqlite3.Error as e:
+                print(f"Search cache read error: {e}")
+                hit = None
+            s.set(hit=hit is not None)
+        if hit is not None:
+            with span("cache_decode", phase="Decoding the cached response", compact=compact, bytes=len(hit)):
+                return decode_compact(hit) if compact else json.loads(hit)
+
+    def fetch_and_store():
+        result = _fetch(fetch)
+        # Only keep real search responses, never error bodies. Stored before the waiters are
+        # released so anybody arriving after this flight gets a cache hit.
+        if isinstance(result, dict) and "Products" in result:
+            try:
+                cache.put(payload, result)
+            except sqlite3.Error as e:
+                print(f"Search cache write error: {e}")
+        return result
+
+    try:
+        result = single_flight(payload, fetch_and_store)
+    except (SearchCancelled, SlotTimeout):
+        # Out of time: an expired entry is better than nothing
+        stale = _stale_entry(cache, payload)
+        if stale is None:
+            raise
+        result = decode_compact(stale) if compact else json.loads(stale)
+        result["Stale"] = True
+        return result
+    return compact_response(result) if compact else result
+
+def _stale_entry(cache, payload):
+    control = current_control()
+    if control is not None and control.cancelled:
+        return None
+    try:
+        return cache.get_text(payload, allow_stale=True)
+    except sqlite3.Error:
+        return None
@@ -0,0 +1,140 @@
+"""
+Reader and writer for KiCad's s-expression files (.kicad_sym, .kicad_mod).
+
+parse() builds the whole tree, for small inputs like one rendered footprint. form_end() finds where one list
+in a buffer (bytes or an mmap) ends without building anything, which is all a library index needs to cut a
+symbol out. dumps() writes a tree back out in KiCad's layout.
+
+Strings never span lines in KiCad files, so a string missing its closing quote ends with its line instead of
+swallowing the rest of the file. A # at the start of a token comments out the rest of its line.
+"""
+import re
+
+# Atoms are anything up to whitespace, a paren or a quote
+TOKEN_RE = re.compile(rb'''
+    (?P<open>\()
+  | (?P<close>\))
+  | (?P<string>"(?:[^"\\\n]|\\.)*"?)
+  | (?<![^\s()])(?P<comment>\#[^\n]*)
+  | (?P<atom>[^\s()"]+)
+''', re.VERBOSE)
+
+# form_end() only needs parens, and strings and comments so the parens inside them are skipped
+FORM_TOKEN_RE = re.compile(rb'[()]|"[^"\\\n]*(?:\\.[^"\\\n]*)*"?|(?<![^\s()])#[^\n]*')
+
+# How deep a list may nest and still be matched in one go, KiCad symbols go about 7 levels deep
+FORM_DEPTH = 12
+
+def _form_pattern(depth):
+    # Balanced parens unrolled depth levels deep: runs of plain bytes, each followed by a string, comment or
+    # sub list. The atomic groups keep a list that does not match from backtracking through every split of a run.
+    plain = rb'(?>[^()"#]*)'
+    special = rb'"[^"\\\n]*(?:\\.[^"\\\n]*)*(?:"|(?=\n)|\Z)|(?<![^\s()])#[^\n]*|#'
+    pattern = rb'\(' + plain + rb'(?:(?:' + special + rb')' + plain + rb')*\)'
+    for _ in range(depth - 1):
+        pattern = rb'\(' + plain + rb'(?:(?:' + special + rb'|' + pattern + rb')' + plain + rb')*\)'
+    return pattern
+
+try:
+    FORM_RE = re.compile(_form_pattern(FORM_DEPTH))
+except re.error:
+    # Atomic groups need Python 3.11, form_end() walks every token without them
+    FORM_RE = None
+
+ESCAPE_RE = re.compile(r'\\(.)', re.DOTALL)
+UNESCAPES = {'n': '\n', 't': '\t', 'r': '\r'}
+
+# Atoms written without quotes by dumps(), anything else is quoted
+BARE_ATOM_RE = re.compile(r'^[^\s()"\\#]+$')
+
+class Quoted(str):
+    """
+    A string that was quoted in the file, as opposed to a bare atom like a keyword or a number.
+    """
+    pass
+
+def unquote(token):
+    """
+    Quoted text of a string token (bytes, with its quotes), escapes resolved.
+    """
+    text = token.decode('utf-8')[1:]
+    if text.endswith('"'):
+        text = text[:-1]
+    return Quoted(ESCAPE_RE.sub(lambda m: UNESCAPES.get(m.group(1), m.group(1)), text))
+
+def quote(text):
+    return '"' + text.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+
+def _value(token):
+    if token.startswith(b'"'):
+        return unquote(token)
+    return token.decode('utf-8')
+
+def parse(text):
+    """
+    Nested lists for every top level form in text (str or bytes).
+    Bare atoms are str, strings are Quoted with their quotes stripped.
+    """
+    if isinstance(text, str):
+        text = text.encode('utf-8')
+    stack = [[]]
+    for match in TOKEN_RE.finditer(text):
+        kind = match.lastgroup
+        if kind == "open":
+            stack.append([])
+        elif kind == "close":
+            if len(stack) > 1:
+                node = stack.pop()
+                stack[-1].append(node)
+        elif kind != "comment":
+            stack[-1].append(_value(match.group()))
+    # Lists left open at the end of the text are kept as they are
+    while len(stack) > 1:
+        node = stack.pop()
+        stack[-1].append(node)
+    return stack[0]
+
+def form_end(buf, start):
+    """
+    Offset just past the paren closing the list that opens at buf[start], None when the text ends first.
+    Only that list is read, so a library index can find one symbol's end without walking the file.
+    """
+    form = FORM_RE.match(buf, start) if FORM_RE is not None else None
+    if form is not None:
+        return form.end()
+    # Nested deeper than FORM_DEPTH, or no atomic groups: count the parens token by token
+    level = 0
+    for match in FORM_TOKEN_RE.finditer(buf, start):
+        token = match.group()
+        if token == b'(':
+            level += 1
+        elif token == b')':
+            level -= 1
+            if level == 0:
+                return match.end()
+    return None
+
+def _atom(value):
+    if isinstance(value, Quoted):
+        return quote(value)
+    if isinstance(value, float):
+        return repr(value)
+    value = str(value)
+    return value if BARE_ATOM_RE.match(value) else quote(value)
+
+def dumps(node, indent=0):
+    """
+    KiCad's layout: a list holding only atoms goes on one line, otherwise every sub list
+    gets its own line one tab further in and the closing paren lines up with the opening one.
+    """
+    pad = "\t" * indent
+    if not isinstance(node, list):
+        return pad + _atom(node)
+    split = next((i for i, item in enumerate(node) if isinstance(item, list)), len(node))
+    first = pad + "(" + " ".join(_atom(item) for item in node[:split])
+    if split == len(node):
+        return first + ")"
+    lines = [first]
+    lines.extend(dumps(item, indent + 1) for item in node[split:])
+    lines.append(pad + ")")
+    return "\n".join(lines)
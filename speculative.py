@@ -0,0 +1,65 @@
+import threading
+import collections
+
+def record_processor(processor):
+    """
+    A processor for ProductRecords from one that takes the full DigiKey JSON, which each record loads with raw().
+    """
+    return lambda record: processor(record.raw())
+
+class SpeculativeRenderer:
+    """
+    Runs the processor and template render for result rows on one background thread,
+    so OK only has to write files. The selected row jumps the queue.
+    processor takes the items as they are submitted, for the result dialog that is ProductRecords,
+    and on_ready(idx) is called on the worker thread once an entry is done.
+    """
+    def __init__(self, processor, renderer, on_ready):
+        self.processor = processor
+        self.renderer = renderer
+        self.on_ready = on_ready
+        self.cond = threading.Condition()
+        self.queue = collections.deque()
+        self.done = {} # product index -> (processed_data, rendered, error)
+        self.stopped = False
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, items):
+        with self.cond:
+            self.queue.extend(items)
+            self.cond.notify()
+
+    def prioritize(self, idx, product):
+        with self.cond:
+            if idx not in self.done:
+                self.queue.appendleft((idx, product))
+                self.cond.notify()
+
+    def get(self, idx):
+        with self.cond:
+            return self.done.get(idx)
+
+    def stop(self):
+        with self.cond:
+            self.stopped = True
+            self.queue.clear()
+            self.cond.notify()
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.queue and not self.stopped:
+                    self.cond.wait()
+                if self.stopped:
+                    return
+                idx, product = self.queue.popleft()
+                if idx in self.done:
+                    continue
+            try:
+                processed_data = self.processor(product)
+                entry = (processed_data, self.renderer(processed_data), None)
+            except Exception as e:
+                entry = (None, None, e)
+            with self.cond:
+                self.done[idx] = entry
+            self.on_ready(idx)
@@ -0,0 +1,43 @@
+import os
+import threading
+import jinja2
+
+PLUGIN_DIR = os.path.dirname(os.path.abspath(__file__))
+BYTECODE_CACHE_DIR = os.path.join(PLUGIN_DIR, ".template_cache")
+
+_env = None
+_env_lock = threading.Lock()
+
+def _bytecode_cache():
+    # Set KICADCOMPMAKER_BYTECODE_CACHE=0 to keep compiled templates in memory only
+    if os.environ.get("KICADCOMPMAKER_BYTECODE_CACHE", "1") == "0":
+        return None
+    try:
+        os.makedirs(BYTECODE_CACHE_DIR, exist_ok=True)
+        return jinja2.FileSystemBytecodeCache(BYTECODE_CACHE_DIR)
+    except OSError as e:
+        print(f"Template bytecode cache disabled: {e}")
+        return None
+
+def get_environment():
+    """
+    One Jinja2 environment for the whole process.
+    Compiled templates are kept in memory and only recompiled when the template file's mtime changes
+    (auto_reload), the bytecode cache carries them over between KiCad sessions.
+    """
+    global _env
+    with _env_lock:
+        if _env is None:
+            _env = jinja2.Environment(
+                loader=jinja2.FileSystemLoader(PLUGIN_DIR),
+                bytecode_cache=_bytecode_cache(),
+                auto_reload=True,
+                cache_size=-1
+            )
+        return _env
+
+def get_template(template_file):
+    return get_environment().get_template(template_file)
+
+def render(template_file, data):
+    return get_template(template_file).render(data)
@@ -0,0 +1,73 @@
+import pytest
+
+# batch_import pulls in the DigiKey client
+pytest.importorskip("requests")
+
+from .. import batch_import
+
+class _Tokens:
+    client_id = "id"
+    def get(self, force_refresh=False):
+        return "token"
+
+RESULTS = {
+    "ProductsCount": 2,
+    "Products": [
+        {"ManufacturerProductNumber": "GONE", "UnitPrice": 0.01, "QuantityAvailable": None},
+        {"ManufacturerProductNumber": "CF14JT10K0", "UnitPrice": 0.1, "QuantityAvailable": 100}
+    ]
+}
+
+def test_blank_optional_columns_use_defaults(tmp_path, monkeypatch):
+    path = tmp_path / "parts.csv"
+    path.write_text("type,value,rating,tolerance,package\nresistor,10k,1/4,,\nalum,22u,50v,,\n", encoding='utf-8')
+    parts = batch_import.read_parts(str(path))
+    assert parts[0]["tolerance"] == "" and parts[1]["package"] == ""
+
+    searches = []
+    def search_resistor(value, pwr_idx, tol_idx, *args):
+        searches.append(("resistor", value, pwr_idx, tol_idx))
+        return RESULTS
+    def search_capacitor(value, vol, type_idx, cat_id, *args):
+        searches.append(("capacitor", value, vol, type_idx))
+        return RESULTS
+    monkeypatch.setattr(batch_import, "search_tht_resistor", search_resistor)
+    monkeypatch.setattr(batch_import, "search_tht_capacitor", search_capacitor)
+    monkeypatch.setattr(batch_import, "process_resistor", lambda p: p["ManufacturerProductNumber"])
+    monkeypatch.setattr(batch_import, "process_capacitor", lambda p, config: p["ManufacturerProductNumber"])
+
+    assert batch_import.search_and_process(parts[0], _Tokens()) == ("CF14JT10K0", RESULTS["Products"][1])
+    assert batch_import.search_and_process(parts[1], _Tokens())[0] == "CF14JT10K0"
+    # 1/4 W at the default 5%, a radial capacitor by default
+    assert searches == [("resistor", "10k", 1, 3), ("capacitor", "22µ", "50v", 1)]
+
+def test_free_part_is_the_cheapest():
+    results = {"Products": [
+        {"ManufacturerProductNumber": "UNPRICED", "UnitPrice": None, "QuantityAvailable": 5},
+        {"ManufacturerProductNumber": "PAID", "UnitPrice": 0.1, "QuantityAvailable": 5},
+        {"ManufacturerProductNumber": "SAMPLE", "UnitPrice": 0, "QuantityAvailable": 5}
+    ]}
+    assert batch_import.pick_cheapest_in_stock(results)["ManufacturerProductNumber"] == "SAMPLE"
+    del results["Products"][2]
+    assert batch_import.pick_cheapest_in_stock(results)["ManufacturerProductNumber"] == "PAID"
+
+def test_progress_reports_rows_before_the_commit(monkeypatch):
+    seen = []
+    class _Batch:
+        def add(self, processed_data, rendered):
+            pass
+        def commit(self):
+            # Every row has been reported by the time the libraries are written
+            assert [r["row"] for r in seen] == [1, 2]
+            return [(True, "written")]
+    def run_row(row_num, part, tokens):
+        report = {"row": row_num, "status": "failed" if part["value"] == "bad" else "rendered", "message": ""}
+        return report, (None if part["value"] == "bad" else {}), None
+    monkeypatch.setattr(batch_import, "TokenManager", lambda *args: _Tokens())
+    monkeypatch.setattr(batch_import, "LibraryBatch", _Batch)
+    monkeypatch.setattr(batch_import, "run_row", run_row)
+
+    reports = batch_import.run_batch([{"value": "10k"}, {"value": "bad"}], "id", "secret", workers=1,
+                                     progress=lambda r: seen.append(dict(r)))
+    assert [(r["row"], r["status"]) for r in seen] == [(1, "rendered"), (2, "failed"), (1, "ok")]
+    assert [(r["row"], r["status"]) for r in reports] == [(1, "ok"), (2, "failed")]
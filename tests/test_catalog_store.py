@@ -0,0 +1,57 @@
+import pytest
+
+# catalog_store pulls in the DigiKey client
+pytest.importorskip("requests")
+
+from .. import catalog_store
+from ..catalog_store import CatalogStore, parse_watts, product_row, query_capacitors
+
+@pytest.mark.parametrize("text, watts", [
+    ("1/4W", 0.25), ("1/4 W", 0.25), ("0.25W, 1/4W", 0.25), ("1/2W, 0.5W", 0.5), ("2W", 2.0), (".5W", 0.5), ("Unknown", None)
+])
+def test_parse_watts(text, watts):
+    assert parse_watts(text) == watts
+
+def test_product_row_reads_the_shared_schema():
+    product = {
+        "ManufacturerProductNumber": "CF14JT10K0",
+        "UnitPrice": None,
+        "QuantityAvailable": None,
+        "ProductVariations": [{"DigiKeyProductNumber": "CF14JT10K0CT-ND"}],
+        "Parameters": [
+            {"ParameterId": 2085, "ValueId": "10 kOhms", "ValueText": "10 kOhms"},
+            {"ParameterId": 3, "ValueText": "±5%"},
+            {"ParameterId": 2, "ValueText": "1/4W"}
+        ]
+    }
+    row = product_row(product, "53")
+    assert (row["key"], row["mpn"]) == ("CF14JT10K0CT-ND", "CF14JT10K0")
+    assert (row["resistance"], row["tolerance"], row["power"]) == (10000.0, 5.0, 0.25)
+    assert (row["capacitance"], row["price"], row["stock"], row["type_id"]) == (None, None, 0, "")
+
+def test_product_row_keys_like_the_result_list():
+    # Tape & Reel listed first, the result list and fan-out key by the Cut Tape PN
+    product = {"ManufacturerProductNumber": "MPN", "ProductVariations": [
+        {"DigiKeyProductNumber": "TR-ND", "PackageType": {"Id": 1}},
+        {"DigiKeyProductNumber": "CT-ND", "PackageType": {"Id": 2}}
+    ]}
+    assert product_row(product, "53")["key"] == "CT-ND"
+
+def _capacitor(pn, spacing="5.00mm"):
+    return {"ManufacturerProductNumber": pn, "QuantityAvailable": 10, "UnitPrice": 0.1,
+            "ProductVariations": [{"DigiKeyProductNumber": pn + "-ND", "PackageType": {"Id": 2}}],
+            "Parameters": [{"ParameterId": 2049, "ValueText": "10 µF"}, {"ParameterId": 508, "ValueText": spacing}]}
+
+def test_full_pass_prunes_delisted_parts(tmp_path, monkeypatch):
+    listing = [_capacitor("A"), _capacitor("B"), _capacitor("C", "2.50mm")]
+    def keyword_search(payload, access_token, client_id, token_refresher=None):
+        return {"ProductsCount": len(listing), "Products": listing[payload["Offset"]:payload["Offset"] + payload["Limit"]]}
+    monkeypatch.setattr(catalog_store, "keyword_search", keyword_search)
+    store = CatalogStore(str(tmp_path / "catalog.sqlite3"))
+
+    assert store.sync_category("58", "token", "client") == 3
+    assert query_capacitors(store, "58", "10 µF", "", lead_spacing_mm=2.5)["ProductsCount"] == 1
+    # B is delisted, the next full pass drops it
+    del listing[1]
+    store.sync_category("58", "token", "client")
+    assert sorted(p["ManufacturerProductNumber"] for p in store.query("58", [], [])["Products"]) == ["A", "C"]
@@ -0,0 +1,37 @@
+import json
+from ..library_manifest import LibraryManifest
+
+TEMPLATE = "symbolTemplates/ResistorSymbolTemplate.txt"
+
+def test_two_writers_keep_each_others_entries(tmp_path):
+    path = str(tmp_path / "manifest.sqlite3")
+    plugin, batch_import = LibraryManifest(path), LibraryManifest(path)
+    plugin.record_symbol("lib.kicad_sym", "R_10k", TEMPLATE, {"value": "10k"}, "(kicad_symbol_lib")
+    batch_import.record_footprint("R.kicad_mod", TEMPLATE, {"pitch": 10.16})
+    plugin.record_symbol("lib.kicad_sym", "R_1k", TEMPLATE, {"value": "1k"}, "(kicad_symbol_lib")
+
+    entries = {key: entry for _, key, entry in LibraryManifest(path).entries()}
+    assert set(entries) == {"R.kicad_mod", ("lib.kicad_sym", "R_10k"), ("lib.kicad_sym", "R_1k")}
+    assert entries[("lib.kicad_sym", "R_10k")]["data"] == {"value": "10k"}
+    assert entries[("lib.kicad_sym", "R_10k")]["preamble"] == "(kicad_symbol_lib"
+    assert entries["R.kicad_mod"]["hash"] is not None
+
+def test_batch_writes_at_the_end(tmp_path):
+    path = str(tmp_path / "manifest.sqlite3")
+    manifest = LibraryManifest(path)
+    manifest.record_footprint("R.kicad_mod", TEMPLATE, {})
+    with manifest.batch():
+        manifest.record_symbol("lib.kicad_sym", "R_10k", TEMPLATE, {}, "")
+        manifest.set_hash("footprint", "R.kicad_mod", "old")
+        assert len(LibraryManifest(path).entries()) == 1
+    entries = {key: entry for _, key, entry in LibraryManifest(path).entries()}
+    assert len(entries) == 2
+    assert entries["R.kicad_mod"]["hash"] == "old"
+
+def test_old_json_manifest_is_carried_over(tmp_path):
+    old = {"version": 1, "footprints": {"R.kicad_mod": {"template": TEMPLATE, "hash": "h", "data": {"a": 1}}},
+           "symbols": {"lib.kicad_sym": {"R": {"template": TEMPLATE, "hash": "h", "data": {}, "preamble": "p"}}}}
+    (tmp_path / "manifest.json").write_text(json.dumps(old))
+    entries = LibraryManifest(str(tmp_path / "manifest.sqlite3")).entries()
+    assert [(kind, key) for kind, key, _ in entries] == [("footprint", "R.kicad_mod"), ("symbol", ("lib.kicad_sym", "R"))]
+    assert entries[0][2] == {"template": TEMPLATE, "hash": "h", "data": {"a": 1}}
@@ -0,0 +1,30 @@
+import threading
+from ..cancellation import SearchControl, activate
+from ..perf_log import span
+
+def _variant(control, phase, entered, release):
+    with activate(control), span("search", phase=phase):
+        entered.set()
+        release.wait(5)
+
+def test_overlapping_variant_phases():
+    control = SearchControl()
+    events = {name: (threading.Event(), threading.Event()) for name in ("a", "b")}
+    threads = {name: threading.Thread(target=_variant, args=(control, f"Searching {name}", *events[name]))
+               for name in events}
+
+    with activate(control), span("fan_out", phase="Searching all variants"):
+        threads["a"].start()
+        assert events["a"][0].wait(5)
+        threads["b"].start()
+        assert events["b"][0].wait(5)
+        assert control.phase == "Searching b"
+
+        # a finishes first: b must not put back the "Searching a" it saw on entry when it ends
+        events["a"][1].set()
+        threads["a"].join(5)
+        assert control.phase == "Searching b"
+        events["b"][1].set()
+        threads["b"].join(5)
+        assert control.phase == "Searching all variants"
+    assert control.phase is None
@@ -0,0 +1,75 @@
+import time
+import pytest
+from .. import rate_limiter
+from ..rate_limiter import RateLimiter, QuotaExceeded, SlotTimeout
+
+class FakeClock:
+    """
+    Stands in for the time module inside rate_limiter, moved on by hand.
+    """
+    def __init__(self):
+        self.now = 1_000_000.0
+        self.wall = time.mktime((2026, 10, 17, 12, 0, 0, 0, 0, 0))
+
+    def monotonic(self):
+        return self.now
+
+    def gmtime(self):
+        return time.gmtime(self.wall)
+
+    def strftime(self, fmt, t):
+        return time.strftime(fmt, t)
+
+    def advance(self, seconds):
+        self.now += seconds
+        self.wall += seconds
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(rate_limiter, "time", fake)
+    return fake
+
+def test_limits_are_learned_from_the_headers(clock):
+    limiter = RateLimiter(store_path=None)
+    limiter.update({"X-BurstLimit-Limit": "60", "X-BurstLimit-Remaining": "3",
+                    "X-RateLimit-Limit": "500", "X-RateLimit-Remaining": "480"})
+    assert limiter.remaining() == {"per_minute": 60, "minute_remaining": 3, "daily_limit": 500,
+                                   "daily_used": 20, "daily_remaining": 480}
+
+    # Missing or garbled headers leave what was learned alone
+    limiter.update({"X-BurstLimit-Limit": "lots"})
+    assert (limiter.per_minute, limiter.daily_limit) == (60, 500)
+
+def test_daily_quota_is_enforced(clock):
+    limiter = RateLimiter(per_day=2, store_path=None)
+    limiter.acquire()
+    limiter.acquire()
+    with pytest.raises(QuotaExceeded):
+        limiter.acquire(timeout=0)
+
+def test_429_holds_every_caller_back(clock):
+    limiter = RateLimiter(store_path=None)
+    limiter.penalize(30)
+    with pytest.raises(SlotTimeout):
+        limiter.acquire(timeout=10)
+    clock.advance(31)
+    limiter.acquire(timeout=0)
+    assert limiter.remaining()["daily_used"] == 1
+
+def test_daily_count_carries_over_to_the_next_session_until_midnight(clock, tmp_path):
+    path = str(tmp_path / "api_quota.json")
+    limiter = RateLimiter(store_path=path)
+    for _ in range(3):
+        limiter.acquire()
+    limiter.count_prefetch()
+    limiter.flush()
+
+    later = RateLimiter(store_path=path)
+    assert later.remaining()["daily_used"] == 3
+    assert later.prefetched_today() == 1
+
+    clock.advance(24 * 3600)
+    tomorrow = RateLimiter(store_path=path)
+    assert tomorrow.remaining()["daily_used"] == 0
+    assert tomorrow.prefetched_today() == 0
@@ -0,0 +1,72 @@
+import time
+import threading
+import pytest
+from ..search_cache import single_flight
+from ..cancellation import SearchControl, SearchCancelled, activate
+
+PAYLOAD = {"Keywords": "resistor", "FilterOptionsRequest": {"ParameterFilterRequest": {"CategoryFilter": {"id": "53"}}}}
+
+def test_waiter_takes_over_a_cancelled_flight():
+    control = SearchControl()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+    outcome = {}
+
+    def owner_fetch():
+        calls.append("owner")
+        started.set()
+        release.wait(5)
+        control.check()
+
+    def waiter_fetch():
+        calls.append("waiter")
+        return {"Products": [], "ProductsCount": 0}
+
+    def owner():
+        with activate(control):
+            try:
+                single_flight(PAYLOAD, owner_fetch)
+            except SearchCancelled as e:
+                outcome["owner"] = e
+
+    def waiter():
+        outcome["waiter"] = single_flight(PAYLOAD, waiter_fetch)
+
+    first = threading.Thread(target=owner)
+    first.start()
+    assert started.wait(5)
+    second = threading.Thread(target=waiter)
+    second.start()
+    # Let the waiter get onto the owner's flight before the owner is cancelled
+    time.sleep(0.1)
+    control.cancel()
+    release.set()
+    first.join(5)
+    second.join(5)
+
+    assert isinstance(outcome["owner"], SearchCancelled)
+    assert outcome["waiter"] == {"Products": [], "ProductsCount": 0}
+    assert calls == ["owner", "waiter"]
+
+def test_waiters_share_the_owners_result():
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return {"Products": [1]}
+
+    results = []
+    owner = threading.Thread(target=lambda: results.append(single_flight(PAYLOAD, fetch)))
+    owner.start()
+    assert started.wait(5)
+    waiter = threading.Thread(target=lambda: results.append(single_flight(PAYLOAD, lambda: pytest.fail("fetched twice"))))
+    waiter.start()
+    time.sleep(0.1)
+    release.set()
+    owner.join(5)
+    waiter.join(5)
+    assert results == [{"Products": [1]}, {"Products": [1]}]
+    assert calls == [1]
@@ -0,0 +1,50 @@
+import threading
+from ..product_records import compact_response, with_source
+from ..speculative import SpeculativeRenderer, record_processor
+
+PAGE = {
+    "ProductsCount": 2,
+    "Products": [
+        {"ManufacturerProductNumber": "CF14JT10K0", "Description": {"DetailedDescription": "10 kOhms 1/4W"},
+         "UnitPrice": 0.1, "QuantityAvailable": 100, "ProductVariations": [{"DigiKeyProductNumber": "CF14JT10K0CT-ND"}]},
+        {"ManufacturerProductNumber": "MFR-25FBF52-10K", "Description": {"DetailedDescription": "10 kOhms 1%"},
+         "UnitPrice": 0.12, "QuantityAvailable": 50, "ProductVariations": [{"DigiKeyProductNumber": "10.0KXBK-ND"}]}
+    ]
+}
+
+def _records():
+    return with_source(compact_response(PAGE), lambda offset=0: PAGE)["Products"]
+
+def _process(product):
+    # Like process_resistor, it wants the DigiKey JSON and fails on anything else
+    return {"mpn": product["ManufacturerProductNumber"], "description": product["Description"]["DetailedDescription"]}
+
+def _render_all(processor, records):
+    ready = threading.Semaphore(0)
+    renderer = SpeculativeRenderer(processor, lambda data: f"(symbol \"{data['mpn']}\")", lambda idx: ready.release())
+    renderer.submit(enumerate(records))
+    for _ in records:
+        assert ready.acquire(timeout=5)
+    renderer.stop()
+    return [renderer.get(idx) for idx in range(len(records))]
+
+def test_records_are_loaded_before_processing():
+    entries = _render_all(record_processor(_process), _records())
+    for (processed_data, rendered, error), product in zip(entries, PAGE["Products"]):
+        assert error is None
+        assert processed_data["mpn"] == product["ManufacturerProductNumber"]
+        assert rendered == f"(symbol \"{product['ManufacturerProductNumber']}\")"
+
+def test_prioritized_record_is_processed():
+    records = _records()
+    ready = threading.Event()
+    renderer = SpeculativeRenderer(record_processor(_process), lambda data: data["mpn"], lambda idx: ready.set())
+    renderer.prioritize(1, records[1])
+    assert ready.wait(5)
+    renderer.stop()
+    assert renderer.get(1) == ({"mpn": "MFR-25FBF52-10K", "description": "10 kOhms 1%"}, "MFR-25FBF52-10K", None)
+
+def test_processor_errors_are_kept_per_row():
+    entries = _render_all(_process, _records())
+    # A processor that expects the JSON but is handed the records, the bug the dialog used to have
+    assert all(processed_data is None and isinstance(error, TypeError) for processed_data, _, error in entries)
@@ -0,0 +1,106 @@
+from ..symbol_library import SymbolLibraryIndex, _read_map
+from ..sexpr import parse
+
+PREAMBLE = '(kicad_symbol_lib\n\t(version 20231120)\n\t(generator "test")\n'
+
+def _symbol(name):
+    return (f'\t(symbol "{name}"\n\t\t(property "Reference" "R")\n'
+            f'\t\t(symbol "{name}_0_1"\n\t\t\t(rectangle (start -1 2) (end 1 -2))\n\t\t)\n\t)')
+
+def _library(tmp_path, text):
+    path = tmp_path / "test.kicad_sym"
+    path.write_text(text, encoding='utf-8')
+    return str(path)
+
+def _check_offsets(index, lib_path):
+    # Offsets kept across edits must match a fresh scan and cut out whole symbol lists
+    kept = index.entries[lib_path][2]
+    fresh = SymbolLibraryIndex()._scan(lib_path)
+    assert kept.spans == fresh.spans
+    assert kept.close == fresh.close
+    data = open(lib_path, 'rb').read()
+    for name, (start, end) in fresh.spans.items():
+        assert parse(data[start:end])[0][:2] == ["symbol", name]
+    assert data[fresh.close:fresh.close + 1] == b")"
+    assert parse(data)[0][0] == "kicad_symbol_lib"
+
+def test_units_are_not_symbols(tmp_path):
+    lib_path = _library(tmp_path, PREAMBLE + _symbol("R") + "\n" + _symbol("C") + "\n)\n")
+    index = SymbolLibraryIndex()
+    assert index.names(lib_path) == ["R", "C"]
+    assert not index.contains(lib_path, "R_0_1")
+    assert index.get(lib_path, "R") == _symbol("R").strip()
+
+def test_append_replace_delete_keep_offsets(tmp_path):
+    lib_path = _library(tmp_path, PREAMBLE + _symbol("A") + "\n" + _symbol("B") + "\n)\n")
+    index = SymbolLibraryIndex()
+
+    assert index.append(lib_path, "C", _symbol("C"), PREAMBLE)
+    assert not index.append(lib_path, "A", _symbol("A"), PREAMBLE)
+    _check_offsets(index, lib_path)
+
+    assert index.commit(lib_path, [("D", _symbol("D")), ("B", _symbol("B"))], PREAMBLE) == {"D": True, "B": False}
+    _check_offsets(index, lib_path)
+
+    longer = _symbol("A").replace('"R")', '"R")\n\t\t(property "Value" "10k")')
+    assert index.replace(lib_path, {"A": longer, "missing": _symbol("missing")}) == ["A"]
+    assert '"10k"' in index.get(lib_path, "A")
+    _check_offsets(index, lib_path)
+
+    assert index.delete(lib_path, ["B", "missing"]) == ["B"]
+    _check_offsets(index, lib_path)
+    assert index.names(lib_path) == ["A", "C", "D"]
+
+def test_commented_symbol_is_not_indexed(tmp_path):
+    lib_path = _library(tmp_path, PREAMBLE + '\t# (symbol "OLD" (property "Reference" "R"))\n' + _symbol("A") + "\n)\n")
+    index = SymbolLibraryIndex()
+    assert index.names(lib_path) == ["A"]
+    assert index.append(lib_path, "OLD", _symbol("OLD"), PREAMBLE)
+    assert index.names(lib_path) == ["A", "OLD"]
+    _check_offsets(index, lib_path)
+
+def test_paren_in_trailing_comment_is_not_the_close(tmp_path):
+    lib_path = _library(tmp_path, PREAMBLE + _symbol("A") + "\n)\n# removed B (was a duplicate)\n")
+    index = SymbolLibraryIndex()
+    assert index.append(lib_path, "B", _symbol("B"), PREAMBLE)
+    assert index.commit(lib_path, [("C", _symbol("C"))], PREAMBLE) == {"C": True}
+    _check_offsets(index, lib_path)
+    text = open(lib_path, encoding='utf-8').read()
+    assert text.endswith("\n)\n# removed B (was a duplicate)\n")
+    assert [node[1] for node in parse(text)[0][3:]] == ["A", "B", "C"]
+
+def test_parens_in_strings_are_skipped(tmp_path):
+    tricky = _symbol("A").replace('"R")', '"R (symbol \\"X\\") )")')
+    lib_path = _library(tmp_path, PREAMBLE + tricky + "\n" + _symbol("B") + "\n)\n")
+    index = SymbolLibraryIndex()
+    assert index.names(lib_path) == ["A", "B"]
+    assert index.get(lib_path, "A") == tricky.strip()
+
+def test_spacing_and_lists_after_the_close(tmp_path):
+    # A head KiCad would write on one line, split over two, and a list that follows the library's close
+    split_head = '\t(symbol\n\t\t"B"\n\t\t(property "Reference" "R")\n\t)'
+    lib_path = _library(tmp_path, PREAMBLE + _symbol("A") + "\n" + split_head + "\n)\n" + _symbol("C") + "\n")
+    index = SymbolLibraryIndex()
+    assert index.names(lib_path) == ["A", "B"]
+    assert index.append(lib_path, "D", _symbol("D"), PREAMBLE)
+    assert index.names(lib_path) == ["A", "B", "D"]
+    _check_offsets(index, lib_path)
+
+def test_store_spares_later_sessions_the_scan(tmp_path, monkeypatch):
+    store = str(tmp_path / "symbol_index.sqlite3")
+    lib_path = _library(tmp_path, PREAMBLE + _symbol("A") + "\n)\n")
+    first = SymbolLibraryIndex(store)
+    assert first.append(lib_path, "B", _symbol("B"), PREAMBLE)
+
+    scans = []
+    monkeypatch.setattr(SymbolLibraryIndex, "_scan", lambda self, path: scans.append(path) or _read_map(open(path, 'rb').read()))
+    later = SymbolLibraryIndex(store)
+    assert later.names(lib_path) == ["A", "B"]
+    assert later.get(lib_path, "B") == _symbol("B").strip()
+    assert scans == []
+
+    # Edited outside the plugin: the stored offsets are not trusted any more
+    with open(lib_path, 'a', encoding='utf-8') as f:
+        f.write("\n")
+    assert SymbolLibraryIndex(store).names(lib_path) == ["A", "B"]
+    assert scans == [lib_path]
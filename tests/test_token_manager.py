@@ -0,0 +1,51 @@
+import threading
+import pytest
+
+# token_manager pulls in the DigiKey client
+pytest.importorskip("requests")
+
+from .. import token_manager
+from ..token_manager import TokenManager
+from ..cancellation import SearchControl, DeadlineExceeded, activate
+
+def test_waiter_takes_over_when_the_owner_runs_out_of_time(monkeypatch):
+    started = threading.Event()
+    calls = []
+
+    def fetch_token(client_id, client_secret):
+        calls.append(threading.current_thread().name)
+        if len(calls) == 1:
+            started.set()
+            # The owner's deadline expires while DigiKey is slow
+            with activate(control):
+                control.wait(1)
+                control.check()
+        return {"access_token": "fresh", "expires_in": 600}
+
+    monkeypatch.setattr(token_manager, "fetch_token", fetch_token)
+    manager = TokenManager("id", "secret", store_path=None)
+    control = SearchControl(deadline=0.2)
+    outcome = {}
+
+    def owner():
+        try:
+            with activate(control):
+                manager.get()
+        except DeadlineExceeded as e:
+            outcome["owner"] = e
+
+    def waiter():
+        outcome["waiter"] = manager.get()
+
+    first = threading.Thread(target=owner)
+    first.start()
+    started.wait(5)
+    second = threading.Thread(target=waiter)
+    second.start()
+    first.join(5)
+    second.join(5)
+
+    assert isinstance(outcome["owner"], DeadlineExceeded)
+    assert str(outcome["owner"]) == "DigiKey did not answer within 0.2 s"
+    assert outcome["waiter"] == "fresh"
+    assert len(calls) == 2
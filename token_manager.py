@@ -0,0 +1,117 @@
+import os
+import json
+import time
+import threading
+from .digikey_client import fetch_token
+from .cancellation import current_control, SearchCancelled
+from .perf_log import span
+
+PLUGIN_DIR = os.path.dirname(os.path.abspath(__file__))
+TOKEN_STORE = os.path.join(PLUGIN_DIR, "token_cache.json")
+
+# Refresh in the background once the token is this close to expiring
+REFRESH_MARGIN = 60
+# Used when the token response has no expires_in
+DEFAULT_EXPIRES_IN = 600
+# How long a caller waits on somebody else's refresh
+REFRESH_WAIT = 30
+
+class TokenManager:
+    """
+    Holds the DigiKey access token for every thread in the process.
+    Only one refresh is ever in flight, concurrent callers wait on it instead of starting their own,
+    and the token is persisted with its expiry so a new KiCad session can reuse it.
+    """
+    def __init__(self, client_id, client_secret, store_path=TOKEN_STORE):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.store_path = store_path
+        self.token = None
+        self.expires_at = 0
+        self.lock = threading.Lock()
+        self.inflight = None
+        self._load()
+
+    def _load(self):
+        if not self.store_path or not os.path.exists(self.store_path):
+            return
+        try:
+            with open(self.store_path, 'r') as f:
+                stored = json.load(f)
+        except Exception:
+            return
+        # A token belongs to the client it was issued for
+        if stored.get("client_id") == self.client_id and stored.get("expires_at", 0) > time.time():
+            self.token = stored.get("access_token")
+            self.expires_at = stored.get("expires_at", 0)
+
+    def _save(self):
+        if not self.store_path:
+            return
+        stored = {"client_id": self.client_id, "access_token": self.token, "expires_at": self.expires_at}
+        try:
+            fd = os.open(self.store_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(stored, f)
+        except OSError as e:
+            print(f"Could not save token: {e}")
+
+    def _valid_token(self):
+        # An expired token is worse than none, callers treat None as "could not get a token"
+        with self.lock:
+            return self.token if time.time() < self.expires_at else None
+
+    def _refresh(self):
+        """
+        Fetch a new token, or wait for the refresh already in flight. When the thread doing that refresh
+        was cancelled or ran out of time its waiters do not inherit that, the first of them takes over.
+        """
+        while True:
+            with self.lock:
+                event = self.inflight
+                owner = event is None
+                if owner:
+                    event = self.inflight = threading.Event()
+                    event.owner_gave_up = False
+            if owner:
+                break
+
+            control = current_control()
+            remaining = None if control is None else control.remaining()
+            finished = event.wait(REFRESH_WAIT if remaining is None else min(REFRESH_WAIT, remaining))
+            if control is not None:
+                control.check()
+            if not (finished and event.owner_gave_up):
+                return self._valid_token()
+
+        try:
+            with span("token_refresh") as s:
+                try:
+                    token_json = fetch_token(self.client_id, self.client_secret)
+                except SearchCancelled:
+                    event.owner_gave_up = True
+                    raise
+                except Exception as e:
+                    s.set(error=str(e))
+                    token_json = None
+                if token_json and token_json.get("access_token"):
+                    expires_in = token_json.get("expires_in") or DEFAULT_EXPIRES_IN
+                    with self.lock:
+                        self.token = token_json["access_token"]
+                        self.expires_at = time.time() + float(expires_in)
+                    self._save()
+        finally:
+            with self.lock:
+                self.inflight = None
+            event.set()
+        return self._valid_token()
+
+    def get(self, force_refresh=False):
+        now = time.time()
+        if force_refresh or not self.token or now >= self.expires_at:
+            return self._refresh()
+
+        if now >= self.expires_at - REFRESH_MARGIN and self.inflight is None:
+            # Still valid, hand it out and refresh behind the caller's back
+            threading.Thread(target=self._refresh, daemon=True).start()
+        return self.token